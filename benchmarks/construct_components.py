@@ -0,0 +1,35 @@
+"""Time and memory of constructing many leaf components
+
+Usage: python benchmarks/construct_components.py [N]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from ngapp.components import Div, QTd, QTr
+from ngapp.utils import EnvironmentType, set_environment
+
+
+def main(n: int):
+    env = set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    env.frontend.update_component = lambda *args, **kwargs: None
+
+    t = time.perf_counter()
+    divs = [Div() for _ in range(n)]
+    t = time.perf_counter() - t
+    print(f"{n} Divs: {1e6 * t / n:.2f} us per component")
+    del divs
+
+    tracemalloc.start()
+    rows = [QTr(QTd("a"), QTd("b"), QTd("c")) for _ in range(n // 4)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{n // 4} table rows (4 components each): {size / n:.0f} bytes per component"
+    )
+    del rows
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
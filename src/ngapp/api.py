@@ -1,22 +1,199 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import certifi
 import orjson
 import urllib3
 
 _CONTENT_TYPES = {
     bytes: "application/octet-stream",
+    # zero-copy buffers, e.g. NumPy arrays from the storage
+    memoryview: "application/octet-stream",
     str: "text/plain",
 }
 
+# Retrying is only safe for requests the backend treats as idempotent
+# (PUT appends to job logs). Connection errors are retried for all methods,
+# since the request never reached the server in that case.
+_IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "DELETE", "OPTIONS", "PATCH"])
 
-def _request(method, url, data):
-    from .utils import get_environment
+_pool_config = {
+    "pool_size": 8,
+    "num_pools": 4,
+    "connect_timeout": 10.0,
+    "read_timeout": 300.0,
+    "retries": 3,
+    "backoff_factor": 0.3,
+}
+_pools: dict[str, urllib3.PoolManager] = {}
+_pools_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_counters = {"requests": 0, "retries": 0}
+_counters_lock = threading.Lock()
+# (url, token) of the backend for requests of the current job, see backend()
+_backend: contextvars.ContextVar[tuple[str, str] | None] = (
+    contextvars.ContextVar("_backend", default=None)
+)
 
-    env = get_environment()
 
-    headers = {
-        "Authorization": env.backend_api_token,
-        "X-Client-Id": env.backend_api_client_id,
+def configure(
+    pool_size: int | None = None,
+    num_pools: int | None = None,
+    connect_timeout: float | None = None,
+    read_timeout: float | None = None,
+    retries: int | None = None,
+    backoff_factor: float | None = None,
+):
+    """Configure the pooled http client used for all backend requests
+
+    :param pool_size: Number of kept-alive connections per host
+    :param num_pools: Number of hosts to keep connection pools for
+    :param connect_timeout: Timeout in seconds to establish a connection
+    :param read_timeout: Timeout in seconds to wait for response data
+    :param retries: Number of retries on connection errors and for idempotent requests
+    :param backoff_factor: Factor for exponential backoff between retries
+    """
+    options = {
+        "pool_size": pool_size,
+        "num_pools": num_pools,
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+        "retries": retries,
+        "backoff_factor": backoff_factor,
     }
+    with _pools_lock:
+        _pool_config.update({k: v for k, v in options.items() if v is not None})
+        _clear_pools()
+
+
+@contextmanager
+def backend(api_url: str, api_token: str):
+    """Send requests of the current thread or task to the given backend
+
+    Overrides the backend of the environment, so that jobs running
+    concurrently in one process use their own url and access token.
+    """
+    token = _backend.set((api_url, api_token))
+    try:
+        yield
+    finally:
+        _backend.reset(token)
+
+
+class RequestError(RuntimeError):
+    """Request answered with an error status by the backend"""
+
+    def __init__(self, message, url, data, status: int):
+        super().__init__(message, url, data)
+        self.status = status
+
+
+def is_unsupported(error: Exception) -> bool:
+    """Check if a request failed because the backend doesn't have the endpoint"""
+    return isinstance(error, RequestError) and error.status in (404, 405)
+
+
+def reset_pools():
+    """Close all pooled connections, e.g. after forking a process"""
+    with _pools_lock:
+        _clear_pools()
+
+
+def _clear_pools():
+    global _executor
+    for pool in _pools.values():
+        pool.clear()
+    _pools.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Threads for concurrent requests, one per pooled connection"""
+    global _executor
+    if _executor is None:
+        with _pools_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_pool_config["pool_size"],
+                    thread_name_prefix="ngapp-api",
+                )
+    return _executor
+
+
+def _create_pool() -> urllib3.PoolManager:
+    config = _pool_config
+    retries = urllib3.Retry(
+        total=config["retries"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=(502, 503, 504),
+        allowed_methods=_IDEMPOTENT_METHODS,
+        raise_on_status=False,
+    )
+    return urllib3.PoolManager(
+        num_pools=config["num_pools"],
+        maxsize=config["pool_size"],
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=certifi.where(),
+        timeout=urllib3.Timeout(
+            connect=config["connect_timeout"], read=config["read_timeout"]
+        ),
+        retries=retries,
+    )
+
+
+def _get_pool(base_url: str) -> urllib3.PoolManager:
+    pool = _pools.get(base_url)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(base_url)
+            if pool is None:
+                pool = _pools[base_url] = _create_pool()
+    return pool
+
+
+def stats() -> dict:
+    """Request and connection counters of the pooled http client
+
+    ``connections`` is the number of opened connections, ``reused`` the
+    number of requests that were sent over an already open connection.
+    """
+    num_requests = 0
+    num_connections = 0
+    with _pools_lock:
+        for manager in _pools.values():
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+    return {
+        "requests": _counters["requests"],
+        "retries": _counters["retries"],
+        "connections": num_connections,
+        "reused": max(num_requests - num_connections, 0),
+    }
+
+
+def _request(method, url, data):
+    from .utils import get_environment
+
+    access = _backend.get()
+    if access is None:
+        env = get_environment()
+        base_url = env.backend_api_url
+        headers = {
+            "Authorization": env.backend_api_token,
+            "X-Client-Id": env.backend_api_client_id,
+        }
+    else:
+        base_url, token = access
+        headers = {"Authorization": token, "X-Client-Id": ""}
     if data is not None:
         content_type = _CONTENT_TYPES.get(type(data), "application/json")
         headers["Content-type"] = content_type
@@ -27,11 +204,13 @@ def _request(method, url, data):
         if isinstance(data, str):
             data = data.encode("utf-8")
 
-    url = env.backend_api_url + url
-    http = urllib3.PoolManager(
-        cert_reqs="CERT_REQUIRED", ca_certs=certifi.where()
-    )
+    http = _get_pool(base_url)
+    url = base_url + url
     response = http.request(method, url, headers=headers, body=data)
+    with _counters_lock:
+        _counters["requests"] += 1
+        if response.retries is not None:
+            _counters["retries"] += len(response.retries.history)
     content_type = response.headers.get("content-type", "")
     data = response.data
     if "application/json" in content_type:
@@ -39,8 +218,11 @@ def _request(method, url, data):
     if "text/" in content_type:
         data = response.data.decode("utf-8")
     if response.status >= 400:
-        raise RuntimeError(
-            f"Request failed: {response.status}, {url}, {data}", url, data
+        raise RequestError(
+            f"Request failed: {response.status}, {url}, {data}",
+            url,
+            data,
+            response.status,
         )
     return data
 
@@ -61,10 +243,102 @@ def put(url, data):
     return _request("PUT", url, data)
 
 
+def patch(url, data):
+    return _request("PATCH", url, data)
+
+
 def delete(url, data=None):
     return _request("DELETE", url, data)
 
 
+async def _arequest(method, url, data):
+    from .utils import is_pyodide
+
+    if is_pyodide():
+        # no threads available, requests are sent one after the other
+        return _request(method, url, data)
+    loop = asyncio.get_running_loop()
+    # executor threads don't inherit the context (backend of the job)
+    return await loop.run_in_executor(
+        _get_executor(),
+        contextvars.copy_context().run,
+        _request,
+        method,
+        url,
+        data,
+    )
+
+
+async def aget(url, data=None):
+    return await _arequest("GET", url, data)
+
+
+async def apost(url, data):
+    return await _arequest("POST", url, data)
+
+
+async def aput(url, data):
+    return await _arequest("PUT", url, data)
+
+
+async def apatch(url, data):
+    return await _arequest("PATCH", url, data)
+
+
+async def adelete(url, data=None):
+    return await _arequest("DELETE", url, data)
+
+
+async def agather(*requests: tuple, return_exceptions: bool = False) -> list:
+    """Send independent requests concurrently, results are in request order
+
+    :param requests: Tuples of (method, url) or (method, url, data)
+    :param return_exceptions: Return exceptions as results instead of raising the first one
+    """
+    return await asyncio.gather(
+        *(_arequest(*_split_request(r)) for r in requests),
+        return_exceptions=return_exceptions,
+    )
+
+
+def request_all(requests: list[tuple], return_exceptions: bool = False) -> list:
+    """Blocking version of :func:`agather`, usable with or without a running event loop
+
+    :param requests: Tuples of (method, url) or (method, url, data)
+    :param return_exceptions: Return exceptions as results instead of raising the first one
+    """
+    from .utils import is_pyodide
+
+    requests = [_split_request(r) for r in requests]
+    if len(requests) <= 1 or is_pyodide():
+        futures = None
+    else:
+        executor = _get_executor()
+        futures = [
+            executor.submit(contextvars.copy_context().run, _request, *r)
+            for r in requests
+        ]
+
+    results = []
+    for i, request in enumerate(requests):
+        try:
+            if futures is None:
+                results.append(_request(*request))
+            else:
+                results.append(futures[i].result())
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+def _split_request(request: tuple) -> tuple:
+    if len(request) == 2:
+        return (request[0], request[1], None)
+    return tuple(request)
+
+
 def load_file(file_id: str):
     """Load a file from backend with given file id"""
     from .app import create_app
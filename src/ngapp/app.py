@@ -20,15 +20,16 @@ from pathlib import Path
 from typing import final
 
 import pydantic
-import urllib3
 
 from . import api, utils
+from .components import basecomponent
 from .components.basecomponent import (
     AppContext,
     Component,
     FileData,
     Storage,
     _QProxy,
+    frontend_batch,
     reset_components,
 )
 from .components.qcomponents import QPage
@@ -285,6 +286,12 @@ class App(QPage):
             app_id=self._config.id,
         )
         self._default_data = None
+        # state of the last save to the backend, for incremental saves
+        self._saved_version = None
+        self._saved_file_id = None
+        self._saved_paths = set()
+        self._saved_data = {}
+        self._tree_cache = None
         self._on_exit_handlers = []
         self._usersettings: UserSettings | None = None
         self.storage = Storage(self)
@@ -332,6 +339,14 @@ class App(QPage):
     def __getitem__(self, key: str) -> Component:
         return self.context.components_by_id[key]
 
+    def batch_updates(self):
+        """
+        Context manager to collect all frontend updates within the block and send
+        one merged update per changed component when the block exits.
+        Event handlers are batched automatically.
+        """
+        return frontend_batch()
+
     def on_exit(self, handler):
         """
         Register a handler to be called when the app is exited.
@@ -447,6 +462,80 @@ class App(QPage):
             "storage": storage,
         }
 
+    def _dump_changed(self, since: int | None) -> dict[tuple, dict | None]:
+        """Copies of the data of components changed after version ``since``
+        (of all components if None) by their path in :meth:`_dump_app`,
+        components without data map to None"""
+        changed = {}
+
+        def func(comp, prefix):
+            if comp._namespace:
+                prefix = prefix + (comp._id,)
+            if since is None or comp._changed_since(since):
+                value = comp._dump()
+                if value and not comp._id:
+                    raise RuntimeError(
+                        f"Component {type(comp)} with input data {value} must have id"
+                    )
+                if comp._id:
+                    changed[prefix + (comp._id,)] = copy.deepcopy(value) or None
+            return prefix
+
+        self._tree().visit((func, ()))
+        return changed
+
+    def _dump_app_delta(self, since: int, changed: dict) -> dict:
+        """Changes since version ``since`` as JSON merge patch of :meth:`_dump_app`
+
+        ``changed`` is the result of :meth:`_dump_changed`, its components are
+        diffed against the data of the last save. Raises ValueError if the
+        changes can't be expressed as merge patch (None values).
+        """
+        data = {}
+        for path, value in changed.items():
+            old = self._saved_data.get(path)
+            if value is None:
+                if old is None:
+                    continue
+                patch = None
+            else:
+                patch = _merge_patch(old or {}, value)
+                if old is not None and not patch:
+                    continue
+            target = data
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = patch
+
+        delta = {
+            "component": {
+                "data": data,
+                "storage": _prune_empty(self._dump_storage(since=since)),
+            },
+            "metadata": {} | self.file_data.__dict__,
+        }
+        if self._version > since:
+            delta["storage"] = self.storage._dump_delta()
+        return delta
+
+    def _tree(self):
+        """Flattened component tree, cached until a slot is changed"""
+        if self._tree_cache is None or not self._tree_cache.valid:
+            self._tree_cache = super()._tree()
+            basecomponent._cached_trees.add(self._tree_cache)
+        return self._tree_cache
+
+    def _component_paths(self) -> set[tuple]:
+        paths = set()
+
+        def func(comp, prefix):
+            if comp._id:
+                paths.add(prefix + (comp._id,))
+            return prefix + (comp._id,) if comp._namespace else prefix
+
+        self._tree().visit((func, ()))
+        return paths
+
     @property
     def env(self):
         return self.context.environment or get_environment()
@@ -494,7 +583,15 @@ class App(QPage):
 
     @final
     def save_backend(self):
-        """Save data to backend"""
+        """Save data to backend
+
+        After the first save, only the changed components are sent as JSON
+        merge patch (PATCH request), diffed against the data of the last save.
+        The full model is sent if components were removed since then, values
+        were set to None or the backend doesn't support PATCH.
+        """
+        global _have_patch_endpoint
+
         env = self.env
         if not env.have_backend:
             raise RuntimeError("No backend available")
@@ -514,9 +611,52 @@ class App(QPage):
                 )
             )
 
-        api.put(f"/model/{status.file_id}", self._dump_app())
+        # changes during the dump get a higher version and are sent next time
+        version = next(basecomponent._version_counter)
+        paths = self._component_paths()
+        incremental = (
+            _have_patch_endpoint
+            and self._saved_version is not None
+            and self._saved_file_id == status.file_id
+            and paths >= self._saved_paths
+        )
+        url = f"/model/{status.file_id}"
+        if incremental:
+            changed = self._dump_changed(self._saved_version)
+            try:
+                delta = self._dump_app_delta(self._saved_version, changed)
+            except ValueError:
+                # merge patches can't set None values
+                incremental = False
+        if incremental:
+            try:
+                api.patch(url, delta)
+            except Exception as e:
+                # send the full model instead
+                if api.is_unsupported(e):
+                    print("Backend has no partial model updates, sending full model")
+                    _have_patch_endpoint = False
+                else:
+                    print("Partial model update failed, sending full model:", e)
+                incremental = False
+        if not incremental:
+            api.put(url, self._dump_app())
+            changed = self._dump_changed(None)
+            self._saved_data = {}
+        for path, value in changed.items():
+            if value is None:
+                self._saved_data.pop(path, None)
+            else:
+                self._saved_data[path] = value
+        self._saved_version = version
+        self._saved_file_id = status.file_id
+        self._saved_paths = paths
+        # removed storage keys are deleted on the backend now
+        storages = self._storages()
+        for storage in storages:
+            storage._removed_keys.clear()
+        self._save_storage_backend(status.file_id, storages)
         self._emit_recursive("save")
-        self.storage.save()
 
         if env.type == EnvironmentType.PYODIDE:
             env.frontend.set_query_parameter("fileId", status.file_id)
@@ -582,7 +722,11 @@ class App(QPage):
     def update(
         self, data: dict, load_local_storage=False, update_frontend=False
     ):
-        """Update app with new data"""
+        """Update app with new data
+
+        Storage data is read on first access, unless ``load_local_storage`` is
+        set: then all of it is read from the current local storage right away.
+        """
         metadata = data.get("metadata", None)
         component_data = data.get(
             "component", data.get("data", {}).get("component", {})
@@ -592,31 +736,44 @@ class App(QPage):
             self.file_data.app_id = metadata.get("app_id", None)
             self.file_data.id = metadata.get("id", None)
 
-        self._emit_recursive("before_load")
-
-        if "storage" in component_data:
-            self._load_storage(component_data["storage"])
-
-        if load_local_storage:
-            self._load_storage_local()
-
-        if "data" in component_data:
-            self._load_recursive(
-                component_data["data"], update_frontend=update_frontend
-            )
-
         def block_frontend_update(comp):
             comp._block_frontend_update = True
 
-        self._recurse(block_frontend_update, True, set())
-        self._emit_recursive("load")
-
         def unblock_frontend_update(comp):
             comp._block_frontend_update = False
             if comp._namespace_id is None:
                 comp._calc_namespace_id()
 
-        self._recurse(unblock_frontend_update, True, set())
+        # slots might have been changed without _set_slot, rebuild the tree
+        self._tree_cache = None
+        with frontend_batch():
+            self._emit_recursive("before_load")
+
+            # load storage metadata and component data in one scan
+            visitors = []
+            if "storage" in component_data:
+                visitors.append(
+                    (Component._load_storage_visitor, component_data["storage"])
+                )
+            if "data" in component_data:
+                visitors.append(
+                    (
+                        Component._load_visitor(update_frontend),
+                        component_data["data"],
+                    )
+                )
+            visitors.append((block_frontend_update, None))
+            self._tree().visit(*visitors)
+
+            # storage data is read on first access (locally or from the
+            # backend), only keys flagged as eager are prefetched
+            if load_local_storage:
+                self._load_storage_local()
+            else:
+                self._prefetch_storage()
+
+            self._emit_recursive("load")
+            self._tree().visit((unblock_frontend_update, None))
 
     def _load_app(
         self,
@@ -626,6 +783,9 @@ class App(QPage):
     ):
         """Load app from stored data"""
 
+        # the next save sends the full model
+        self._saved_version = None
+        self._saved_data = {}
         self._namespace_id = ""
         self._parent = self
         self.context = self.context
@@ -686,7 +846,7 @@ class App(QPage):
 
     def _load_data_file(self, name):
         if is_pyodide():
-            http = urllib3.PoolManager()
+            http = api._get_pool(os.environ["WEBAPP_API_URL"])
             response = http.request(
                 "GET",
                 self._get_file_url(name),
@@ -727,6 +887,45 @@ BaseModel = App
 
 _app_cache = {}
 
+# set to False if the backend doesn't support partial model updates
+_have_patch_endpoint = True
+
+
+def _prune_empty(data: dict) -> dict:
+    """Remove empty dicts (namespaces without changes) from a storage delta"""
+    for key, value in list(data.items()):
+        if isinstance(value, dict):
+            if not _prune_empty(value):
+                del data[key]
+    return data
+
+
+def _merge_patch(old: dict, new: dict) -> dict:
+    """JSON merge patch (RFC 7396) that turns old into new
+
+    Raises ValueError if new contains None in a dict, a merge patch can only
+    remove such keys.
+    """
+    patch = dict.fromkeys(old.keys() - new.keys())
+    for key, value in new.items():
+        old_value = old.get(key)
+        if value is None:
+            if key in old and old_value is None:
+                continue
+            raise ValueError("None values can't be set by a merge patch", key)
+        if isinstance(value, dict):
+            if isinstance(old_value, dict):
+                value = _merge_patch(old_value, value)
+                if not value:
+                    continue
+            else:
+                # merged into an empty dict
+                value = _merge_patch({}, value)
+            patch[key] = value
+        elif key not in old or old_value != value:
+            patch[key] = value
+    return patch
+
 
 def _get_app_config(
     app_config: int | dict | AppConfigWithAccess,
@@ -0,0 +1,167 @@
+"""Streaming of compute job output to the backend"""
+
+import codecs
+import contextvars
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from .. import api
+
+
+class LogPump:
+    """Forwards the output of a running job while it runs
+
+    The job writes stdout and stderr to files, which are read in the
+    background and appended to the job logs on the backend in batches: at
+    most ``chunk_size`` bytes per stream every ``interval`` seconds, the rest
+    stays on disk until the next batch. Every ``sample_interval`` seconds, the
+    memory and cpu usage of the job's process group is added to stdout as a
+    status line (on Linux).
+    """
+
+    interval = 1.0
+    chunk_size = 64 * 1024
+    sample_interval = 10.0
+
+    def __init__(
+        self, api_url: str, stdout: Path, stderr: Path, echo: bool = True
+    ):
+        self.api_url = api_url
+        self.echo = echo
+        self._files = {"stdout": stdout, "stderr": stderr}
+        self._offsets = {name: 0 for name in self._files}
+        self._decoders = {
+            name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for name in self._files
+        }
+        self._status = []
+        self._pgid = None
+        self._last_sample = None
+        self.max_rss = 0
+        self._stop = threading.Event()
+        # send with the backend access of the job (see api.backend)
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run, args=(self._run,), daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def set_process(self, pgid: int):
+        """Sample resource usage of the process group pgid"""
+        self._pgid = pgid
+
+    def stop(self, status: str = ""):
+        """Send the remaining output, followed by the status line"""
+        self._stop.set()
+        self._thread.join()
+        if self.max_rss:
+            self._status.append(
+                f"max memory usage {self.max_rss / 2**20:.0f} MB"
+            )
+        if status:
+            self._status.append(status)
+        for attempt in range(3):
+            try:
+                while self._flush(self.chunk_size, final=True):
+                    pass
+                return
+            except Exception as e:
+                print("could not send job output", e, flush=True)
+                time.sleep(self.interval)
+
+    def _run(self):
+        next_sample = time.monotonic() + self.sample_interval
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= next_sample:
+                next_sample += self.sample_interval
+                self._sample()
+            try:
+                self._flush(self.chunk_size)
+            except Exception as e:
+                print("could not send job output", e, flush=True)
+
+    def _read(self, name: str, size: int, final: bool) -> tuple[bytes, bool]:
+        """Returns the next bytes of the stream and whether all of it was read"""
+        try:
+            with open(self._files[name], "rb") as f:
+                f.seek(self._offsets[name])
+                data = f.read(size)
+        except FileNotFoundError:
+            data = b""
+        return data, len(data) < size
+
+    def _flush(self, size: int, final: bool = False) -> bool:
+        """Send up to size bytes per stream, returns True if any were sent
+
+        A stream only advances once its output was sent, after a failed
+        request the same output is sent again with the next batch.
+        """
+        texts, read, states = {}, {}, {}
+        status = []
+        for name in self._files:
+            data, complete = self._read(name, size, final)
+            decoder = self._decoders[name]
+            states[name] = decoder.getstate()
+            texts[name] = decoder.decode(data, final=final and complete)
+            read[name] = len(data)
+            # status lines after all output written so far
+            if name == "stdout" and complete:
+                status = self._status
+                texts[name] += "".join(f"\nSTATUS: {s}\n" for s in status)
+        names = [name for name, text in texts.items() if text]
+        results = api.request_all(
+            [("PUT", f"{self.api_url}/{name}", texts[name]) for name in names],
+            return_exceptions=True,
+        )
+        errors = {
+            name: result
+            for name, result in zip(names, results)
+            if isinstance(result, Exception)
+        }
+        for name in self._files:
+            if name in errors:
+                self._decoders[name].setstate(states[name])
+                continue
+            self._offsets[name] += read[name]
+            if name == "stdout":
+                self._status = self._status[len(status) :]
+            if self.echo and texts[name]:
+                print(texts[name], end="", file=getattr(sys, name), flush=True)
+        if errors:
+            raise next(iter(errors.values()))
+        return bool(names)
+
+    def _sample(self):
+        if self._pgid is None or not os.path.exists("/proc/self/stat"):
+            return
+        rss = ticks = 0
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    # the command name may contain spaces
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except (OSError, IndexError):
+                continue
+            if int(fields[2]) == self._pgid:
+                ticks += int(fields[11]) + int(fields[12])
+                rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        now = time.monotonic()
+        if self._last_sample is not None:
+            last_now, last_ticks = self._last_sample
+            cpu = (
+                (ticks - last_ticks)
+                / os.sysconf("SC_CLK_TCK")
+                / (now - last_now)
+            )
+            self._status.append(
+                f"memory {rss / 2**20:.0f} MB, cpu {100 * cpu:.0f}%"
+            )
+        self._last_sample = (now, ticks)
+        self.max_rss = max(self.max_rss, rss)
@@ -0,0 +1,316 @@
+"""Warm worker processes for compute jobs
+
+Running every compute job in a fresh interpreter re-imports ngapp, numpy,
+pydantic, pint and the app package, which often takes longer than the job
+itself. A warm worker is a server process that imports all of them once and
+forks a child per job, which starts with everything loaded.
+
+There is one worker per (app, python packages hash, compute environment,
+interpreter, environment variables), listening on a unix socket, so that it
+is shared by all processes on the node (rq forks a new work horse for every
+job). It is started on demand and exits after a number of jobs, when its
+memory grew too much, or when it was idle for a while; the next job then
+starts a new one. Closing the connection cancels the running job.
+"""
+
+import hashlib
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from importlib import import_module
+from pathlib import Path
+
+import orjson
+
+from .._version import version
+
+max_jobs = 100
+max_rss_growth_mb = 512
+idle_timeout = 1800
+start_timeout = 60
+
+available = (
+    sys.platform != "win32"
+    and hasattr(os, "fork")
+    and hasattr(socket, "AF_UNIX")
+)
+
+
+def _socket_dir() -> Path:
+    """Directory for the sockets of the workers, only accessible by this user
+
+    Jobs contain the access token of the backend, so the socket must not be in
+    a place where another user could bind it first.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    path = Path(base) / f"ngapp-workers-{os.getuid()}"
+    path.mkdir(mode=0o700, exist_ok=True)
+    stat = path.lstat()
+    if (
+        not path.is_dir()
+        or path.is_symlink()
+        or stat.st_uid != os.getuid()
+        or stat.st_mode & 0o077
+    ):
+        raise RuntimeError(f"Unsafe directory for worker sockets: {path}")
+    return path
+
+
+def _socket_path(key) -> Path:
+    digest = hashlib.sha256(orjson.dumps([version, *key])).hexdigest()[:16]
+    # unix socket paths are limited to ~100 characters
+    return _socket_dir() / f"worker-{digest}.sock"
+
+
+def run_job(
+    key, python, env: dict, app: dict, job: dict, on_start=None
+) -> dict:
+    """Run a job in the warm worker for key, start the worker if needed
+
+    :param key: Tuple identifying the worker, jobs with the same key share it
+    :param python: Interpreter to start the worker with
+    :param env: Environment variables of the worker
+    :param app: App config, the app package is imported when the worker starts
+    :param job: Dict with the encoded ``data`` (RunData), ``cwd`` and the
+        file names for ``stdout`` and ``stderr`` of the job
+    :param on_start: Called with the process group id of the job once it runs
+    :returns: Dict with ``returncode`` and ``max_rss`` (in kB) of the job
+    """
+    path = _socket_path(key)
+    for attempt in range(3):
+        conn = _connect(path, python, env, app)
+        with conn, conn.makefile("rwb") as f:
+            try:
+                f.write(orjson.dumps(job) + b"\n")
+                f.flush()
+                started = f.readline()
+            except ConnectionError:
+                started = b""
+            if not started:
+                # the worker shut down before accepting the job, retry
+                continue
+            if on_start is not None:
+                on_start(orjson.loads(started)["pid"])
+            result = f.readline()
+            if not result:
+                raise RuntimeError("Worker process died while running job")
+            return orjson.loads(result)
+    raise RuntimeError("Could not submit job to worker process")
+
+
+def _connect(path: Path, python, env, app) -> socket.socket:
+    started = False
+    deadline = time.monotonic() + start_timeout
+    while True:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(str(path))
+            return conn
+        except (FileNotFoundError, ConnectionRefusedError):
+            conn.close()
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Worker process at {path} did not start")
+        if not started:
+            _start_worker(path, python, env, app)
+            started = True
+        time.sleep(0.05)
+
+
+def _start_worker(path: Path, python, env, app):
+    print("start warm worker", path, flush=True)
+    log = open(path.with_suffix(".log"), "ab")
+    p = subprocess.Popen(
+        [str(python), "-m", "ngapp.cli.pool", str(path)],
+        stdin=subprocess.PIPE,
+        stdout=log,
+        stderr=log,
+        env=env,
+        cwd=tempfile.gettempdir(),
+        start_new_session=True,
+    )
+    p.stdin.write(orjson.dumps(app))
+    p.stdin.close()
+    log.close()
+
+
+def _bind(path: Path) -> socket.socket | None:
+    """Bind the server socket, returns None if another worker owns it"""
+    import fcntl
+
+    with open(path.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if path.exists():
+            try:
+                sock.connect(str(path))
+                sock.close()
+                return None
+            except ConnectionRefusedError:
+                # left over from a crashed worker
+                path.unlink()
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(str(path))
+        sock.listen(64)
+        return sock
+
+
+def _preload(app: dict):
+    for name in ["numpy", "pint", "pydantic", "ngapp.app", "ngapp.cli.run"]:
+        try:
+            import_module(name)
+        except ImportError:
+            pass
+    python_class = app.get("python_class")
+    if python_class:
+        try:
+            import_module(python_class.rsplit(".", 1)[0])
+        except Exception as e:
+            print("could not preload app module", python_class, e, flush=True)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def serve(path: Path, app: dict):
+    """Serve jobs on the socket at path until the worker should be recycled"""
+    sock = _bind(path)
+    if sock is None:
+        print("worker already running at", path, flush=True)
+        return
+    _preload(app)
+    baseline = _rss_mb()
+    supervisors = set()
+    jobs = 0
+    last_job = time.monotonic()
+    sock.settimeout(5)
+    try:
+        while jobs < max_jobs and _rss_mb() - baseline < max_rss_growth_mb:
+            for pid in list(supervisors):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    supervisors.discard(pid)
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                if not path.exists():
+                    # removed by cleanup of the temp dir
+                    break
+                if (
+                    not supervisors
+                    and time.monotonic() - last_job > idle_timeout
+                ):
+                    break
+                continue
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                sock.close()
+                _supervise(conn)
+            conn.close()
+            supervisors.add(pid)
+            jobs += 1
+            last_job = time.monotonic()
+    finally:
+        # unlink before closing, a new worker may bind the path right away
+        path.unlink(missing_ok=True)
+        sock.close()
+        for pid in supervisors:
+            os.waitpid(pid, 0)
+    print(f"worker exits after {jobs} jobs, rss {_rss_mb():.0f} MB", flush=True)
+
+
+def _supervise(conn: socket.socket):
+    """Run one job in a child process and report its exit code"""
+    code = 1
+    try:
+        conn.settimeout(None)
+        with conn.makefile("rwb") as f:
+            job = orjson.loads(f.readline())
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                _run_job(job)
+            f.write(orjson.dumps({"pid": pid}) + b"\n")
+            f.flush()
+            status, usage = _wait(pid, conn)
+            max_rss = usage.ru_maxrss
+            if sys.platform == "darwin":
+                max_rss //= 1024
+            result = {
+                "returncode": os.waitstatus_to_exitcode(status),
+                "max_rss": max_rss,
+            }
+            f.write(orjson.dumps(result) + b"\n")
+            f.flush()
+        code = 0
+    except Exception as e:
+        print("error in worker", e, flush=True)
+    finally:
+        os._exit(code)
+
+
+def _wait(pid: int, conn: socket.socket):
+    """Wait for the job, kill it when the client closes the connection"""
+    while True:
+        done, status, usage = os.wait4(pid, os.WNOHANG)
+        if done:
+            return status, usage
+        readable, _, _ = select.select([conn], [], [], 0.2)
+        if readable and not conn.recv(1):
+            try:
+                os.killpg(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                # the job did not create its process group yet
+                os.kill(pid, signal.SIGTERM)
+            _, status, usage = os.wait4(pid, 0)
+            return status, usage
+
+
+def _run_job(job: dict):
+    code = 1
+    try:
+        # own process group, to cancel the job with everything it started
+        os.setsid()
+        os.chdir(job["cwd"])
+        for fd, name in [(1, "stdout"), (2, "stderr")]:
+            out = os.open(
+                job[name], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+            )
+            os.dup2(out, fd)
+            os.close(out)
+        sys.stdin = open(os.devnull)
+        os.environ.update(job.get("env", {}))
+
+        from .. import api
+        from .run import RunData, main
+
+        # connections of the parent must not be shared
+        api.reset_pools()
+        main(RunData.load(job["data"]))
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+if __name__ == "__main__":
+    serve(Path(sys.argv[1]), orjson.loads(sys.stdin.buffer.read()))
@@ -1,11 +1,17 @@
 import base64
 import glob
+import hashlib
+import importlib.metadata
+import io
 import os
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from zipfile import ZipFile
 
 import orjson
 from pydantic import BaseModel
@@ -21,6 +27,8 @@ from ..utils import (
     set_environment,
     write_file,
 )
+from . import pool
+from .log_pump import LogPump
 
 _VENV_DIR = Path(f"/tmp/webapp_venv_compute_environments_{version}")
 
@@ -66,50 +74,116 @@ class RunData(BaseModel):
         return RunData.model_validate(orjson.loads(base64.b64decode(data)))
 
 
-def create_venv(venv_path):
-    subprocess.check_output([sys.executable, "-m", "venv", venv_path])
+# common dependencies of all apps, installed once in a shared base venv
+_BASE_PACKAGES = ["numpy", "pint", "pydantic", "urllib3", "certifi"]
+# number of venvs per app kept, in addition to the ones used recently
+keep_app_venvs = 2
+venv_max_age = 7 * 24 * 3600
 
 
-def install_webapp_wheels(venv_path):
-    """Install ngapp wheels and their dependencies from backend in venv"""
-    wheels = ["ngapp"]
-    site_dir = glob.glob(str(venv_path / "lib/python3.*/site-packages/"))[0]
-    for package_name in wheels:
-        data = api.get(f"/pyodide/client_package/{package_name}")
-        filename = "package.zip"
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_file = Path(temp_dir) / filename
-            with open(temp_file, "wb") as f:
-                f.write(data)
-            subprocess.check_output(["unzip", temp_file, "-d", site_dir])
-            os.remove(temp_file)
+def _lock_path(path: Path) -> Path:
+    return path.with_name(path.name + ".lock")
+
+
+@contextmanager
+def _locked(path: Path, blocking: bool = True):
+    """Exclusive lock for building/removing the venv at path
+
+    The lock file may be removed while the lock is held (together with the
+    venv), then the lock is taken again on the new file.
+    """
+    import fcntl
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = _lock_path(path)
+    while True:
+        with open(lock_path, "a") as lock:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(lock, flags)
+            try:
+                removed = (
+                    os.stat(lock_path).st_ino != os.fstat(lock.fileno()).st_ino
+                )
+            except FileNotFoundError:
+                removed = True
+            if not removed:
+                yield
+                return
+
+
+def _site_packages(venv_path: Path) -> Path:
+    return Path(glob.glob(str(venv_path / "lib/python3.*/site-packages/"))[0])
+
+
+def _pip_install(venv_path: Path, *args):
     subprocess.check_output(
         [
             venv_path / "bin/python",
             "-m",
             "pip",
             "install",
-            "numpy",
-            "pint",
-            "pydantic",
-            "urllib3",
-            "certifi",
+            "--cache-dir",
+            _VENV_DIR / "pip_cache",
+            *args,
         ]
     )
 
 
+def create_venv(venv_path, with_pip: bool = True):
+    args = [] if with_pip else ["--without-pip"]
+    subprocess.check_output([sys.executable, "-m", "venv", *args, venv_path])
+
+
+def _requirements() -> list[str]:
+    try:
+        return importlib.metadata.requires("ngapp") or []
+    except importlib.metadata.PackageNotFoundError:
+        return []
+
+
+def create_base_venv() -> Path:
+    """Shared venv with the common dependencies, built once per python version,
+    ngapp version and requirements of ngapp"""
+    key = hashlib.sha256(
+        orjson.dumps([sys.version, version, _BASE_PACKAGES, _requirements()])
+    ).hexdigest()
+    venv_path = _VENV_DIR / "base" / key[:16]
+    if (venv_path / ".ready").exists():
+        return venv_path
+    with _locked(venv_path):
+        if not (venv_path / ".ready").exists():
+            print("create base venv", venv_path)
+            shutil.rmtree(venv_path, ignore_errors=True)
+            create_venv(venv_path)
+            _pip_install(venv_path, *_BASE_PACKAGES)
+            (venv_path / ".ready").touch()
+    return venv_path
+
+
+def install_webapp_wheels(venv_path, data: bytes):
+    """Install ngapp client package from backend in venv"""
+    with ZipFile(io.BytesIO(data)) as f:
+        f.extractall(_site_packages(venv_path))
+
+
 def install_packages(venv_path, packages):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        wheel_names = []
-        for p in packages:
-            data = base64.b64decode(p["data"].encode())
-            file_path = Path(temp_dir) / p["name"]
-            with open(file_path, "wb") as file:
-                file.write(data)
-            wheel_names.append(file_path)
-        subprocess.check_output(
-            [venv_path / "bin/python", "-m", "pip", "install", *wheel_names]
-        )
+    wheel_names = []
+    for p in packages:
+        data = base64.b64decode(p["data"].encode())
+        # keyed by content, wheels may be rebuilt without a version bump
+        wheel_dir = _VENV_DIR / "wheels" / hashlib.sha256(data).hexdigest()
+        file_path = wheel_dir / Path(p["name"]).name
+        if file_path.exists():
+            # last use, for remove_old_wheels
+            wheel_dir.touch()
+        else:
+            wheel_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(file_path)
+        wheel_names.append(file_path)
+    if wheel_names:
+        _pip_install(venv_path, *wheel_names)
 
 
 def create_app_venv(app: dict):
@@ -118,95 +192,211 @@ def create_app_venv(app: dict):
         raise RuntimeError("App does not have python packages hash")
     venv_path = _VENV_DIR / str(app["id"]) / venv_hash
 
-    if venv_path.exists():
+    if (venv_path / ".ready").exists():
+        (venv_path / ".ready").touch()
         return venv_path
 
-    print("create venv for app", app["id"], app["name"], "with hash", venv_hash)
+    with _locked(venv_path):
+        if (venv_path / ".ready").exists():
+            return venv_path
+        print(
+            "create venv for app",
+            app["id"],
+            app["name"],
+            "with hash",
+            venv_hash,
+        )
+        shutil.rmtree(venv_path, ignore_errors=True)
+        client_package, packages = api.request_all(
+            [
+                ("GET", "/pyodide/client_package/ngapp"),
+                ("POST", "/get_app_python_packages", {"app_id": app["id"]}),
+            ]
+        )
+        base_path = create_base_venv()
+        # the app venv sees the packages (and pip) of the base venv
+        create_venv(venv_path, with_pip=False)
+        site_dir = _site_packages(venv_path)
+        base_site_dir = _site_packages(base_path)
+        (site_dir / "_ngapp_base_venv.pth").write_text(
+            f"import site; site.addsitedir({str(base_site_dir)!r})\n"
+        )
+        install_webapp_wheels(venv_path, client_package)
+        install_packages(venv_path, packages)
+        (venv_path / ".ready").touch()
 
-    create_venv(venv_path)
-    install_webapp_wheels(venv_path)
-    packages = api.post("/get_app_python_packages", data={"app_id": app["id"]})
-    install_packages(venv_path, packages)
+    remove_old_venvs(venv_path.parent)
+    remove_old_wheels()
     return venv_path
 
 
+def remove_old_venvs(app_dir: Path):
+    """Remove venvs of old package hashes of an app, unless used recently"""
+    now = time.time()
+    venvs = sorted(
+        (p for p in app_dir.iterdir() if (p / ".ready").exists()),
+        key=lambda p: (p / ".ready").stat().st_mtime,
+        reverse=True,
+    )
+    for venv_path in venvs[keep_app_venvs:]:
+        if now - (venv_path / ".ready").stat().st_mtime < venv_max_age:
+            continue
+        try:
+            with _locked(venv_path, blocking=False):
+                print("remove old venv", venv_path)
+                (venv_path / ".ready").unlink()
+                shutil.rmtree(venv_path, ignore_errors=True)
+                _lock_path(venv_path).unlink()
+        except BlockingIOError:
+            # being rebuilt right now
+            pass
+    # left over from failed builds
+    for lock_path in app_dir.glob("*.lock"):
+        venv_path = lock_path.with_suffix("")
+        if (venv_path / ".ready").exists():
+            continue
+        try:
+            if now - lock_path.stat().st_mtime < venv_max_age:
+                continue
+            with _locked(venv_path, blocking=False):
+                shutil.rmtree(venv_path, ignore_errors=True)
+                lock_path.unlink()
+        except (BlockingIOError, FileNotFoundError):
+            pass
+
+
+def remove_old_wheels():
+    """Remove cached wheels that were not installed recently"""
+    now = time.time()
+    wheels_dir = _VENV_DIR / "wheels"
+    if not wheels_dir.exists():
+        return
+    for wheel_dir in wheels_dir.iterdir():
+        try:
+            if now - wheel_dir.stat().st_mtime >= venv_max_age:
+                shutil.rmtree(wheel_dir, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
 def run_compute_function(
     data: RunData | str,
+    on_start=None,
 ):
+    """Run a compute function in a separate process
+
+    :param data: Job description
+    :param on_start: Called with the process group id of the job once it
+        runs, terminating the process group cancels the job
+    :returns: Exit code of the job process, None if it could not be started
+    """
     try:
         if isinstance(data, str):
             data = RunData.load(data)
+    except Exception as e:
+        print("error", e, flush=True)
+        print_exception(e)
+        return None
+
+    set_environment(EnvironmentType.COMPUTE)
+    # several jobs may run in this process (serve_compute_env), so the
+    # backend access is per job instead of global
+    with api.backend(data.api_url, data.api_token):
+        return _run_compute_function(data, on_start)
 
-        env = set_environment(EnvironmentType.COMPUTE)
-        env.set_backend(data.api_url, data.api_token)
 
+def _run_compute_function(data: RunData, on_start):
+    returncode = None
+    try:
         api_url = f"/job/{data.job_id}"
-        api.post(f"{api_url}/stdout", "\nSTATUS: Job started on compute node\n")
-        api.post(f"{api_url}/stderr", "")
-        api.put(api_url, {"status": "Running"})
+        api.request_all(
+            [
+                (
+                    "POST",
+                    f"{api_url}/stdout",
+                    "\nSTATUS: Job started on compute node\n",
+                ),
+                ("POST", f"{api_url}/stderr", ""),
+                ("PUT", api_url, {"status": "Running"}),
+            ]
+        )
 
         if data.use_venv:
             venv_path = create_app_venv(data.app)
-            command = [venv_path / "bin/python"]
+            python = venv_path / "bin/python"
         else:
-            command = [sys.executable]
-        command += ["-m", "ngapp.cli.run"]
-
-        # track maximum RSS memory and elapsed time using /usr/bin/time tool
-        if sys.platform == "linux" and os.path.exists("/usr/bin/time"):
-            command = [
-                "/usr/bin/time",
-                "-q",
-                "-f",
-                "%M",
-                "-o",
-                "mem_usage",
-            ] + command
-        elif sys.platform == "darwin" and os.path.exists(
-            "/opt/homebrew/bin/gtime"
-        ):
-            command = [
-                "/opt/homebrew/bin/gtime",
-                "-q",
-                "-f",
-                "%M",
-                "-o",
-                "mem_usage",
-            ] + command
+            python = sys.executable
+        command = [python, "-m", "ngapp.cli.run"]
 
         with tempfile.TemporaryDirectory() as temp_dir:
             tmp = Path(temp_dir)
             env = os.environ.copy()
             env.update(data.env)
-            p = subprocess.Popen(
-                command,
-                stdout=open(tmp / "stdout", "wb"),
-                stdin=subprocess.PIPE,
-                stderr=open(tmp / "stderr", "wb"),
-                text=False,
-                cwd=temp_dir,
-                env=env,
-            )
-            p.communicate(input=data.dump_bytes())[0]
-            api.put(f"{api_url}/stdout", (tmp / "stdout").read_text("utf-8"))
-            api.post(f"{api_url}/stderr", (tmp / "stderr").read_text("utf-8"))
-            print("stdout\n", (tmp / "stdout").read_text("utf-8"), "\n")
-            print("stderr\n", (tmp / "stderr").read_text("utf-8"))
-        api.put(
-            f"{api_url}/stdout",
-            f"\nSTATUS: Job finished on compute node with exit code {p.returncode}",
-        )
-        print("return code", p.returncode)
+            pump = LogPump(api_url, tmp / "stdout", tmp / "stderr")
+
+            def started(pgid):
+                pump.set_process(pgid)
+                if on_start is not None:
+                    on_start(pgid)
+
+            pump.start()
+            try:
+                # deployed app packages don't change for a given hash, so
+                # their imports can be kept in a warm worker
+                if data.use_venv and pool.available:
+                    key = (
+                        data.app_id,
+                        data.app["python_packages_hash"],
+                        data.compute_env.get("name"),
+                        str(python),
+                        sorted(data.env.items()),
+                    )
+                    job = {
+                        "data": data.dump(),
+                        "cwd": temp_dir,
+                        "stdout": str(tmp / "stdout"),
+                        "stderr": str(tmp / "stderr"),
+                    }
+                    result = pool.run_job(
+                        key, python, env, data.app, job, started
+                    )
+                    returncode = result["returncode"]
+                    pump.max_rss = max(pump.max_rss, result["max_rss"] * 1024)
+                else:
+                    with (
+                        open(tmp / "stdout", "wb") as stdout,
+                        open(tmp / "stderr", "wb") as stderr,
+                    ):
+                        p = subprocess.Popen(
+                            command,
+                            stdout=stdout,
+                            stdin=subprocess.PIPE,
+                            stderr=stderr,
+                            text=False,
+                            cwd=temp_dir,
+                            env=env,
+                            start_new_session=True,
+                        )
+                        started(p.pid)
+                        p.communicate(input=data.dump_bytes())
+                    returncode = p.returncode
+            finally:
+                pump.stop(
+                    f"Job finished on compute node with exit code {returncode}"
+                )
+        print("return code", returncode)
         api.put(
-            api_url, {"status": "Finished" if p.returncode == 0 else "Failed"}
+            api_url, {"status": "Finished" if returncode == 0 else "Failed"}
         )
     except Exception as e:
         print("error", e, flush=True)
         print_exception(e)
+    return returncode
 
 
-def main():
-    data = RunData.load(input())
+def main(data: RunData | None = None):
+    if data is None:
+        data = RunData.load(input())
     set_environment(EnvironmentType.COMPUTE)
     env = get_environment()
     env.set_backend(data.api_url, data.api_token)
@@ -1,32 +1,166 @@
 """command line interface for webapp to serve a compute environment"""
 
 import asyncio
+import os
+import signal
 import ssl
-import threading
 
 import certifi
 import orjson
 import websockets
 
+from .. import api
 from ..utils import EnvironmentType, get_environment, set_environment
 from .run import RunData, run_compute_function
 from .serve_in_venv import get_args_parser
 
 set_environment(EnvironmentType.COMPUTE, True)
 
+_MEMORY_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
 
-def handle_task(data_string):
-    data = RunData.load(data_string)
-    print(
-        f"handle task, file_id={data.file_id}, func={data.func_name}",
-        flush=True,
-    )
+
+def parse_memory(memory: str | int) -> int:
+    """Memory size like "512M" or "4G" in bytes"""
+    if isinstance(memory, int):
+        return memory
+    memory = memory.strip().upper().removesuffix("B").removesuffix("I")
+    unit = memory[-1] if memory and memory[-1] in _MEMORY_UNITS else ""
+    return int(float(memory.removesuffix(unit)) * _MEMORY_UNITS[unit])
+
+
+def _total_memory() -> int:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+class JobExecutor:
+    """Runs jobs concurrently within the cpu and memory limits of this machine
+
+    Jobs are started in the order they were submitted, as soon as the cpus and
+    memory of their compute environment are available. At most ``max_queued``
+    jobs wait for resources, submitting more blocks (and thus stops reading
+    from the websocket).
+    """
+
+    def __init__(self, cpus: int, memory: int, max_queued: int):
+        self.cpus = cpus
+        self.memory = memory
+        self._used_cpus = 0
+        self._used_memory = 0
+        self._queue: asyncio.Queue[RunData] = asyncio.Queue(max_queued)
+        self._resources = asyncio.Condition()
+        self._jobs: dict[int, int | None] = {}
+        self._cancelled: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def _requirements(self, data: RunData):
+        cpus = int(data.compute_env.get("cpus", 1))
+        memory = parse_memory(data.compute_env.get("memory", 0))
+        # too large jobs run alone instead of never
+        return min(cpus, self.cpus), (
+            min(memory, self.memory) if self.memory else 0
+        )
+
+    def _fits(self, cpus, memory):
+        return self._used_cpus + cpus <= self.cpus and (
+            not self.memory or self._used_memory + memory <= self.memory
+        )
+
+    async def submit(self, data: RunData):
+        """Queue a job, waits while the queue is full"""
+        self._jobs[data.job_id] = None
+        await self._queue.put(data)
+
+    def cancel(self, job_id: int):
+        """Cancel a queued or running job"""
+        if job_id not in self._jobs:
+            return
+        self._cancelled.add(job_id)
+        pgid = self._jobs[job_id]
+        if pgid is not None:
+            try:
+                os.killpg(pgid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    async def run(self):
+        """Start queued jobs when resources are available"""
+        while True:
+            data = await self._queue.get()
+            if data.job_id in self._cancelled:
+                await asyncio.to_thread(self._finish, data, True)
+                continue
+            cpus, memory = self._requirements(data)
+            async with self._resources:
+                await self._resources.wait_for(lambda: self._fits(cpus, memory))
+                self._used_cpus += cpus
+                self._used_memory += memory
+            task = asyncio.create_task(self._run_job(data, cpus, memory))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_job(self, data: RunData, cpus: int, memory: int):
+        print(
+            f"handle task, file_id={data.file_id}, func={data.func_name}",
+            flush=True,
+        )
+        loop = asyncio.get_running_loop()
+
+        def on_start(pgid):
+            self._jobs[data.job_id] = pgid
+            if data.job_id in self._cancelled:
+                # cancelled while starting
+                loop.call_soon_threadsafe(self.cancel, data.job_id)
+
+        try:
+            await asyncio.to_thread(run_compute_function, data, on_start)
+        finally:
+            try:
+                stopped = data.job_id in self._cancelled
+                await asyncio.to_thread(self._finish, data, stopped)
+            finally:
+                async with self._resources:
+                    self._used_cpus -= cpus
+                    self._used_memory -= memory
+                    self._resources.notify_all()
+
+    def _finish(self, data: RunData, stopped: bool):
+        self._jobs.pop(data.job_id, None)
+        self._cancelled.discard(data.job_id)
+        if stopped:
+            api_url = f"/job/{data.job_id}"
+            with api.backend(data.api_url, data.api_token):
+                api.request_all(
+                    [
+                        ("PUT", api_url, {"status": "Stopped"}),
+                        (
+                            "PUT",
+                            f"{api_url}/stderr",
+                            "\nSTATUS: Job stopped by user\n",
+                        ),
+                    ],
+                    return_exceptions=True,
+                )
+
+
+def handle_message(executor: JobExecutor, msg):
+    """Returns the job to submit, or handles a control message"""
+    if isinstance(msg, bytes):
+        msg = msg.decode()
+    if msg.startswith("{"):
+        message = orjson.loads(msg)
+        if message.get("type") == "cancel":
+            executor.cancel(int(message["job_id"]))
+        return None
+    data = RunData.load(msg)
     data.use_venv = False
     data.capture_output = False
-    run_compute_function(data)
+    return data
 
 
-async def main(arg):
+async def main(args):
     app_id = int(args.app_id)
     ws_url = args.backend_url + "/ws/connect"
     ws_url = ws_url.replace("https://", "wss://")
@@ -35,6 +169,13 @@ async def main(arg):
     if ws_url.startswith("wss://"):
         ssl_context = ssl.create_default_context(cafile=certifi.where())
 
+    memory = (
+        parse_memory(args.max_memory) if args.max_memory else _total_memory()
+    )
+    executor = JobExecutor(args.max_cpus, memory, args.max_queued)
+    print(f"run jobs on {executor.cpus} cpus, {memory / 2**30:.1f} GB memory")
+    executor_task = asyncio.create_task(executor.run())
+
     while True:
         try:
             async with websockets.connect(ws_url, ssl=ssl_context) as websocket:
@@ -49,19 +190,38 @@ async def main(arg):
                 )
                 while True:
                     msg = await websocket.recv()
-                    thread = threading.Thread(target=handle_task, args=(msg,))
-                    thread.start()
-                    thread.join()
+                    data = handle_message(executor, msg)
+                    if data is not None:
+                        await executor.submit(data)
         except KeyboardInterrupt:
             break
         except Exception as e:
             print("Error", e)
+    executor_task.cancel()
 
 
 if __name__ == "__main__":
     parser = get_args_parser(
         description="Serve an app frontend and compute node from local machine"
     )
+    parser.add_argument(
+        "--max_cpus",
+        help="Number of cpus to use for concurrent jobs (default: all)",
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--max_memory",
+        help='Memory to use for concurrent jobs, e.g. "16G" (default: all)',
+        type=str,
+        default="",
+    )
+    parser.add_argument(
+        "--max_queued",
+        help="Number of jobs waiting for resources before no more are received",
+        type=int,
+        default=64,
+    )
     args = parser.parse_args()
 
     env = get_environment()
@@ -6,7 +6,9 @@ from .visualization import *
 from ngapp.observable import (
     Observable,
     bind,
+    computed,
     observable_batch,
+    superseded,
     collect_observables,
     snapshot,
     restore,
@@ -3,9 +3,18 @@ import copy
 import dataclasses
 import functools
 import inspect
+import io
 import itertools
+import os
 import pickle
 import sys
+import tempfile
+import threading
+import time
+import types
+import weakref
+import zlib
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Callable, List, Optional, Tuple, TypeVar
 import datetime
@@ -27,10 +36,27 @@ from ..utils import (
 from .. import utils
 
 _component_counter = itertools.count(1)
-_components = {}
-_components_with_id = {}
+# components store the version of their last change to dump only changes
+_version_counter = itertools.count(1)
+# changed whenever a slot is changed, invalidates cached component trees
+_tree_version = 0
+_cached_trees = weakref.WeakSet()
+# components are only referenced weakly, the app holds its component tree
+_components = weakref.WeakValueDictionary()
+_components_with_id = weakref.WeakValueDictionary()
+# components shown in the frontend but not (necessarily) part of the tree,
+# e.g. created by slot functions, are kept alive until they are unmounted
+_mounted_components = {}
 
 _local_storage_path = Path.home() / ".cache" / "webapp_local_storage"
+_local_storage_max_bytes = int(
+    os.environ.get("NGAPP_LOCAL_STORAGE_MAX_BYTES", 10 * 1024**3)
+)
+_local_stores = {}
+_have_files_exist_endpoint = True
+
+# shared default of per-instance dicts that are allocated on first write
+_EMPTY_DICT = types.MappingProxyType({})
 
 
 class _QProxy:
@@ -46,12 +72,77 @@ def get_component(index: int):
 
 
 def unmount_component(index: int):
-    if index in _components:
-        _components[index]._handle("unmount")
+    comp = _components.get(index, None)
+    if comp is not None:
+        comp._handle("unmount")
+    _mounted_components.pop(index, None)
 
 
 def reset_components():
     _components.clear()
+    _components_with_id.clear()
+    _mounted_components.clear()
+
+
+def component_stats() -> dict[str, int]:
+    """Number of live components by type, to find components that are never released"""
+    counts = {}
+    for comp in list(_components.values()):
+        name = type(comp).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+
+_frontend_batch = threading.local()
+
+
+@contextmanager
+def frontend_batch():
+    """Coalesce frontend updates of components until the block exits.
+
+    Within the block, prop, slot and storage updates sent by
+    :meth:`Component._update_frontend` are merged per component instead of
+    being sent one by one. When the outermost block exits, one merged
+    update message is sent for every changed component. Batches may be
+    nested and are tracked per thread. Every event handler called by
+    :meth:`Component._handle` runs inside such a batch.
+    """
+    depth = getattr(_frontend_batch, "depth", 0)
+    if depth == 0:
+        _frontend_batch.pending = {}
+    _frontend_batch.depth = depth + 1
+    try:
+        yield
+    finally:
+        _frontend_batch.depth -= 1
+        if _frontend_batch.depth == 0:
+            _flush_frontend_updates()
+
+
+def _queue_frontend_update(comp, data):
+    pending = _frontend_batch.pending
+    if data is None or (comp in pending and pending[comp] is None):
+        # a full update is generated at flush time and covers everything
+        pending[comp] = None
+        return
+    merged = pending.setdefault(comp, {})
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(value)
+        elif isinstance(value, dict):
+            merged[key] = dict(value)
+        else:
+            merged[key] = value
+
+
+def _flush_frontend_updates():
+    pending = getattr(_frontend_batch, "pending", None)
+    if not pending:
+        return
+    _frontend_batch.pending = {}
+    get_environment().frontend.update_components(
+        [(comp, data, "update_frontend") for comp, data in pending.items()]
+    )
 
 
 @dataclasses.dataclass
@@ -68,7 +159,7 @@ class AppContext:
     capture_call_stack: bool = False
     environment: utils.Environment = None
     components_by_id: dict[str, object] = dataclasses.field(
-        default_factory=dict
+        default_factory=weakref.WeakValueDictionary
     )
     _cached_app_id: int | None = None
 
@@ -126,6 +217,18 @@ class _StorageMetadataEntry(pydantic.BaseModel):
     hash: str
     size: int
     type_: str
+    eager: bool = False
+    codec: str = "none"
+    # dtype and shape of NumPy arrays stored as raw buffer
+    dtype: str | None = None
+    shape: list[int] | None = None
+    # large values are stored in chunks, each with its own hash
+    chunks: list[str] | None = None
+    chunk_size: int | None = None
+
+    def blobs(self) -> list[str]:
+        """Hashes of all stored blobs of this entry"""
+        return self.chunks or [self.hash]
 
 
 class _StorageMetadata(pydantic.BaseModel):
@@ -134,51 +237,434 @@ class _StorageMetadata(pydantic.BaseModel):
     def get(self, key: str):
         return self.entries.get(key, None)
 
-    def set(self, key: str, value: bytes, type_: str, id: bytes):
-        self.entries[key] = _StorageMetadataEntry(
+    def set(
+        self,
+        key: str,
+        value: bytes | memoryview,
+        type_: str,
+        id: bytes,
+        eager=False,
+        codec="none",
+        dtype=None,
+        shape=None,
+        chunk_size=None,
+    ):
+        extra = () if codec == "none" else (codec.encode(),)
+        chunks = None
+        if chunk_size and len(value) > chunk_size:
+            view = memoryview(value)
+            chunks = [
+                calc_hash(id, view[i : i + chunk_size], *extra)
+                for i in range(0, len(view), chunk_size)
+            ]
+            hash_ = calc_hash(id, *(c.encode() for c in chunks), *extra)
+        else:
+            chunk_size = None
+            hash_ = calc_hash(id, value, *extra)
+        entry = self.entries[key] = _StorageMetadataEntry(
             key=key,
-            hash=calc_hash(id, value),
+            hash=hash_,
             size=len(value),
             type_=type_,
+            eager=eager,
+            codec=codec,
+            dtype=dtype,
+            shape=shape,
+            chunks=chunks,
+            chunk_size=chunk_size,
         )
+        return entry
+
+
+_storage_codecs: dict[str, tuple[Callable, Callable] | None] = {
+    "none": None,
+    "zlib": (functools.partial(zlib.compress, level=6), zlib.decompress),
+}
+
+try:
+    import zstandard
+
+    _storage_codecs["zstd"] = (
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+
+    _storage_codecs["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+
+
+def _get_storage_codec(name: str):
+    if name not in _storage_codecs:
+        raise ValueError(f"Unknown storage codec {name}")
+    return _storage_codecs[name]
+
+
+def register_storage_codec(
+    name: str,
+    compress: Callable[[bytes], bytes],
+    decompress: Callable[[bytes], bytes],
+):
+    """Register a compression codec that can be used for :class:`Storage` data"""
+    _storage_codecs[name] = (compress, decompress)
+
+
+class _LocalBlobStore:
+    """Content addressed blob store in a local directory
+
+    Blobs are stored by hash in sharded subdirectories and written atomically.
+    Reading a blob marks it as recently used, and when the total size exceeds
+    ``max_bytes``, the least recently used blobs are evicted. Without
+    ``max_bytes`` the store is the only copy of the blobs and nothing is
+    evicted.
+    """
+
+    def __init__(self, path: Path, max_bytes: int | None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+            "evictions": 0,
+        }
+
+    def _blob_path(self, hash_: str) -> Path:
+        return self.path / hash_[:2] / hash_
+
+    def _find(self, hash_: str) -> Path | None:
+        path = self._blob_path(hash_)
+        if path.exists():
+            return path
+        # flat layout of older versions
+        path = self.path / hash_
+        if path.is_file():
+            return path
+        return None
+
+    def has(self, hash_: str) -> bool:
+        return self._find(hash_) is not None
+
+    def read(self, hash_: str) -> bytes | None:
+        path = self._find(hash_)
+        if path is None:
+            self._stats["misses"] += 1
+            return None
+        data = path.read_bytes()
+        self._touch(path)
+        self._stats["hits"] += 1
+        self._stats["bytes_read"] += len(data)
+        return data
+
+    def write(self, hash_: str, data: bytes):
+        path = self._find(hash_)
+        if path is not None:
+            self._touch(path)
+            return
+        path = self._blob_path(hash_)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self._stats["bytes_written"] += len(data)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+        if self.max_bytes is not None and self.size() > self.max_bytes:
+            self._evict(keep=path)
+
+    def _touch(self, path: Path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _blobs(self):
+        for path in self.path.rglob("*"):
+            if path.name.startswith(".tmp-") or not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            yield path, stat
+
+    def size(self) -> int:
+        """Total size of all stored blobs in bytes"""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(stat.st_size for _, stat in self._blobs())
+            return self._size
+
+    def _evict(self, keep: Path | None = None):
+        # evict down to 90% to not run an eviction on every write
+        target = int(self.max_bytes * 0.9)
+        with self._lock:
+            blobs = sorted(self._blobs(), key=lambda b: b[1].st_mtime)
+            size = sum(stat.st_size for _, stat in blobs)
+            for path, stat in blobs:
+                if size <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                size -= stat.st_size
+                self._stats["evictions"] += 1
+            self._size = size
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return self._stats | {
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _get_local_store() -> _LocalBlobStore:
+    path = Path(_local_storage_path)
+    store = _local_stores.get(path)
+    if store is None:
+        store = _local_stores[path] = _LocalBlobStore(path, None)
+    # without backend, the local storage is where the data is saved
+    store.max_bytes = (
+        _local_storage_max_bytes if get_environment().have_backend else None
+    )
+    return store
+
+
+def _as_ndarray(value):
+    """Returns value if it is a NumPy array that can be stored as raw buffer"""
+    # don't import numpy just to find out that value is no array
+    numpy = sys.modules.get("numpy")
+    # other arrays (empty, datetime, object, ...) are encoded as JSON
+    if (
+        numpy is not None
+        and isinstance(value, numpy.ndarray)
+        and value.dtype.kind in "biufc"
+        and value.size > 0
+    ):
+        return value
+    return None
+
+
+def local_storage_stats() -> dict:
+    """Usage statistics of the local storage (hits, hit rate, stored bytes, ...)"""
+    return _get_local_store().stats()
+
+
+class _StorageReader(io.RawIOBase):
+    """File-like reader of stored data, fetches one chunk at a time"""
+
+    def __init__(self, storage: "Storage", key: str):
+        self._storage = storage
+        self._key = key
+        self._mdata = storage._metadata.get(key)
+        self._pos = 0
+        self._chunk = None
+        self._chunk_index = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._mdata.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, buffer):
+        size = self._mdata.size
+        if self._pos >= size:
+            return 0
+        index, offset = divmod(self._pos, self._mdata.chunk_size or size)
+        if index != self._chunk_index:
+            self._chunk = self._storage._read_chunk(self._key, index)
+            self._chunk_index = index
+            if self._chunk is None:
+                raise OSError(f"Storage data for '{self._key}' not available")
+        n = min(len(buffer), len(self._chunk) - offset)
+        buffer[:n] = self._chunk[offset : offset + n]
+        self._pos += n
+        return n
 
 
 class Storage:
     """Storage class for components, use it to store large chunks of data on the backend"""
 
+    __slots__ = (
+        "_data",
+        "_metadata",
+        "_needs_deletion",
+        "_needs_save",
+        "_removed_keys",
+        "_encoded",
+        "_component",
+    )
+
     _data: dict[str, str | dict | list | bytes]
     _metadata: _StorageMetadata
     _needs_deletion: list[str]
     _needs_save: set[str]
+    _removed_keys: set[str]
+    _encoded: dict[str, bytes | memoryview]
     _component: C
 
+    # data of at least this size is compressed with default_codec
+    compression_threshold: int = 64 * 1024
+    # zlib is also available in the browser, zstd and lz4 need extra packages
+    default_codec: str = "zlib"
+    # larger data is split into chunks that are transferred one by one
+    chunk_size: int = 8 * 1024 * 1024
+    # number of blobs (or chunks) that are uploaded concurrently
+    max_parallel_uploads: int = 8
+
     def __init__(self, component: C | "ngapp.App"):
         self._component = component
         self._data = {}
         self._metadata = _StorageMetadata(entries={})
         self._needs_deletion = []
         self._needs_save = set()
+        self._removed_keys = set()
+        # encoded (uncompressed) values from set() that are not saved yet
+        self._encoded = {}
 
-    def _encode(self, value: str | dict | list | bytes) -> bytes:
+    def _encode(
+        self, value: str | dict | list | bytes, codec: str = "none"
+    ) -> bytes | memoryview:
         if isinstance(value, bytes):
-            return value
-        if isinstance(value, str):
-            return value.encode("utf-8")
-        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+            data = value
+        elif _as_ndarray(value) is not None:
+            # zero-copy view of the array memory
+            data = memoryview(value).cast("B")
+        elif isinstance(value, str):
+            data = value.encode("utf-8")
+        else:
+            data = orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+        if codec != "none":
+            data = _get_storage_codec(codec)[0](data)
+        return data
 
-    def _decode(self, value: bytes, type_: str) -> str | dict | list | bytes:
+    def _decode(
+        self, value: bytes | bytearray, mdata: _StorageMetadataEntry
+    ) -> str | dict | list | bytes:
+        type_ = mdata.type_
         if type_ == "str":
             return value.decode("utf-8")
         if type_ in ["bytes", "pickle"]:
-            return value
+            return bytes(value)
+        if type_ == "ndarray" and mdata.dtype is not None:
+            import numpy
+
+            # read-only array sharing the memory of the received data
+            return numpy.frombuffer(value, dtype=mdata.dtype).reshape(
+                mdata.shape
+            )
         return orjson.loads(value)
 
+    def _encoded_value(self, key: str) -> bytes | memoryview:
+        """Encoded (uncompressed) value, reuses the buffer from set()"""
+        data = self._encoded.get(key)
+        if data is None:
+            data = self._encoded[key] = self._encode(self._data[key])
+        return data
+
+    def _stored_data(self, key: str, index: int | None = None):
+        """Compressed data of a value or one of its chunks as it is stored"""
+        mdata = self._metadata.get(key)
+        data = self._encoded_value(key)
+        if index is not None:
+            start = index * mdata.chunk_size
+            data = memoryview(data)[start : start + mdata.chunk_size]
+        if mdata.codec != "none":
+            data = _get_storage_codec(mdata.codec)[0](data)
+        return data
+
+    def _fetch(self, hash_: str) -> bytes | None:
+        if not get_environment().have_backend:
+            return _get_local_store().read(hash_)
+        file_id = self._component.context.file_id
+        if file_id is None:
+            return None
+        return api.get(f"/files/{file_id}/files/{hash_}")
+
+    def _read_chunk(self, key: str, index: int) -> bytes | None:
+        """Encoded (uncompressed) data of one chunk, None if it is not available"""
+        mdata = self._metadata.get(key)
+        if key in self._needs_save and key in self._data:
+            # not stored yet
+            data = self._encoded_value(key)
+            if mdata.chunks is None:
+                return data
+            start = index * mdata.chunk_size
+            return memoryview(data)[start : start + mdata.chunk_size]
+        data = self._fetch(mdata.blobs()[index])
+        if data is not None and mdata.codec != "none":
+            data = _get_storage_codec(mdata.codec)[1](data)
+        return data
+
+    def _read(self, key: str) -> bytes | bytearray | None:
+        """Fetch and reassemble the encoded data of a stored value"""
+        mdata = self._metadata.get(key)
+        if mdata.chunks is None:
+            return self._read_chunk(key, 0)
+        # fill a preallocated buffer to not hold all chunks and a joined copy
+        buffer = bytearray(mdata.size)
+        for index in range(len(mdata.chunks)):
+            chunk = self._read_chunk(key, index)
+            if chunk is None:
+                return None
+            start = index * mdata.chunk_size
+            buffer[start : start + len(chunk)] = chunk
+        return buffer
+
     def _dump_metadata(self):
-        return self._metadata.model_dump()["entries"]
+        return self._metadata.model_dump(exclude_defaults=True)["entries"]
 
     def _dump_data(self):
+        # data is loaded on first access, fetch everything that is still missing
+        for key in self._metadata.entries:
+            if key not in self._data:
+                self.load(key)
         return copy.deepcopy(self._data)
 
+    def _dump_delta(self):
+        """Metadata as JSON merge patch of :meth:`_dump_metadata`, removed keys
+        and fields with default values are set to None"""
+        fields = dict.fromkeys(_StorageMetadataEntry.model_fields)
+        return {key: None for key in self._removed_keys} | {
+            key: fields | entry.model_dump(exclude_defaults=True)
+            for key, entry in self._metadata.entries.items()
+        }
+
     def _dump(self, include_data=False):
         metadata = self._dump_metadata()
         if include_data:
@@ -192,20 +678,31 @@ class Storage:
     def _load_metadata(self, data):
         self._metadata = _StorageMetadata(entries=data)
 
-    def _load_local(self):
-        for key, mdata in self._metadata.entries.items():
-            local_path = _local_storage_path / mdata.hash
-            if local_path.exists():
-                self._data[key] = self._decode(
-                    local_path.read_bytes(), mdata.type_
-                )
+    def _load_local(self, keys: list[str] | None = None):
+        if keys is None:
+            keys = list(self._metadata.entries.keys())
+        for key in keys:
+            mdata = self._metadata.get(key)
+            if mdata is None:
+                continue
+            data = self._read(key)
+            if data is not None:
+                self._data[key] = self._decode(data, mdata)
 
     def _save_local(self):
-        _local_storage_path.mkdir(parents=True, exist_ok=True)
+        store = _get_local_store()
         for key, mdata in self._metadata.entries.items():
-            local_path = _local_storage_path / mdata.hash
-            if not local_path.exists() and key in self._data:
-                local_path.write_bytes(self._encode(self._data[key]))
+            if key not in self._data:
+                continue
+            for index, hash_ in enumerate(mdata.blobs()):
+                if not store.has(hash_):
+                    store.write(
+                        hash_,
+                        self._stored_data(
+                            key, None if mdata.chunks is None else index
+                        ),
+                    )
+        self._encoded.clear()
 
     def _load_data(self, data: dict | None):
         if data is None:
@@ -218,7 +715,7 @@ class Storage:
 
     def load(self, key: str):
         if not get_environment().have_backend:
-            self._load_local()
+            self._load_local([key])
             return
         file_id = self._component.context.file_id
         if file_id is None:
@@ -226,27 +723,84 @@ class Storage:
         mdata = self._metadata.get(key)
         if mdata is None:
             return
-        data = api.get(f"/files/{file_id}/files/{mdata.hash}")
-        self._data[key] = self._decode(data, mdata.type_)
+        data = self._read(key)
+        if data is None:
+            return
+        self._data[key] = self._decode(data, mdata)
         if key in self._needs_save:
             self._needs_save.remove(key)
 
     def save(self):
-        if not self._needs_save:
+        if not self._needs_save and not self._needs_deletion:
             return
         if not get_environment().have_backend:
             self._save_local()
             return
-        file_id = self._component.context.file_id
-        if self._needs_deletion:
-            api.delete(f"/files/{file_id}/files", data=self._needs_deletion)
-        for key in self._needs_save:
-            mdata = self._metadata.get(key)
-            api.post(
-                f"/files/{file_id}/files/{mdata.hash}",
-                self._encode(self._data[key]),
+        Storage._save_backend([self], self._component.context.file_id)
+
+    @staticmethod
+    def _save_backend(storages: list["Storage"], file_id):
+        """Upload all unsaved data of the given storages
+
+        Deletions are sent in one request, data that the backend already has
+        (same hash) is skipped and the remaining blobs are uploaded concurrently.
+        Large values are uploaded chunk by chunk, an interrupted save continues
+        with the chunks that are still missing on the backend.
+        """
+        global _have_files_exist_endpoint
+
+        uploads = {}
+        deletions = set()
+        for storage in storages:
+            deletions.update(storage._needs_deletion)
+            for key in storage._needs_save:
+                mdata = storage._metadata.get(key)
+                if mdata is None or key not in storage._data:
+                    continue
+                if mdata.chunks is None:
+                    uploads[mdata.hash] = (storage, key, None)
+                else:
+                    for index, hash_ in enumerate(mdata.chunks):
+                        uploads[hash_] = (storage, key, index)
+        deletions -= uploads.keys()
+
+        if deletions:
+            api.delete(f"/files/{file_id}/files", data=sorted(deletions))
+
+        if len(uploads) > 1 and _have_files_exist_endpoint:
+            try:
+                existing = api.post(
+                    f"/files/{file_id}/files_exist",
+                    {"hashes": list(uploads.keys())},
+                )
+                for hash_ in existing:
+                    uploads.pop(hash_, None)
+            except Exception as e:
+                # upload everything
+                if api.is_unsupported(e):
+                    print("Backend has no files_exist, uploading all files")
+                    _have_files_exist_endpoint = False
+                else:
+                    print("Could not check existing files, uploading all:", e)
+
+        # compress only right before sending to bound the memory usage
+        uploads = list(uploads.items())
+        step = Storage.max_parallel_uploads
+        for i in range(0, len(uploads), step):
+            api.request_all(
+                [
+                    (
+                        "POST",
+                        f"/files/{file_id}/files/{hash_}",
+                        storage._stored_data(key, index),
+                    )
+                    for hash_, (storage, key, index) in uploads[i : i + step]
+                ]
             )
-        self._needs_save.clear()
+        for storage in storages:
+            storage._needs_save.clear()
+            storage._needs_deletion.clear()
+            storage._encoded.clear()
 
     def get(self, key: str, default=None):
         """Get data from storage"""
@@ -264,13 +818,37 @@ class Storage:
 
         return value
 
+    def open(self, key: str) -> io.BufferedReader:
+        """Open stored data as binary file for streaming reads
+
+        The file contains the encoded value (the bytes, utf-8 for strings,
+        JSON for dicts and lists, the raw buffer for NumPy arrays). Chunks of
+        large values are only fetched when they are read.
+        """
+        if key not in self._metadata.entries:
+            raise KeyError(key)
+        return io.BufferedReader(_StorageReader(self, key))
+
     def set(
         self,
         key: str,
         value: str | dict | list | bytes | object,
         use_pickle=False,
+        eager=False,
+        codec: str | None = None,
     ):
-        """Set data in storage"""
+        """Set data in storage
+
+        Stored data is loaded on first access with :meth:`get`. Keys set with
+        ``eager=True`` are prefetched in the background when the app is loaded.
+
+        ``codec`` selects the compression of the stored data ("none", "zlib",
+        "zstd", "lz4" or a registered codec). By default, data larger than
+        :attr:`compression_threshold` is compressed with :attr:`default_codec`.
+
+        NumPy arrays are stored as raw buffer (dtype and shape in the metadata),
+        loaded arrays share the memory of the received data.
+        """
         from ..app import App
 
         if use_pickle:
@@ -279,38 +857,206 @@ class Storage:
         else:
             type_ = type(value).__name__
 
-        if key in self._data and value == self._data[key]:
-            return
-
-        old_hash = None
-        if key in self._metadata.entries:
-            old_hash = self._metadata.get(key).hash
+        # keep a private copy, the encoded buffer below is a view of it;
+        # bytes and str are immutable and need no copy
+        array = _as_ndarray(value)
+        if array is not None:
+            value = array.copy(order="C")
+        elif not isinstance(value, (bytes, str)):
+            value = copy.deepcopy(value)
+
+        # encode and hash only once, the buffer is reused when saving
+        encoded = self._encode(value)
+        if codec is None:
+            codec = (
+                self.default_codec
+                if len(encoded) >= self.compression_threshold
+                else "none"
+            )
+        _get_storage_codec(codec)
 
-        self._data[key] = copy.deepcopy(value)
         fullid = (
             "__app__"
             if isinstance(self._component, App)
             else self._component._fullid
         )
-        self._metadata.set(
+        old_entry = self._metadata.get(key)
+        entry = self._metadata.set(
             key,
-            self._encode(value),
+            encoded,
             type_,
             id=self._encode(fullid),
+            eager=eager,
+            codec=codec,
+            dtype=value.dtype.str if array is not None else None,
+            shape=list(value.shape) if array is not None else None,
+            chunk_size=self.chunk_size,
         )
+        self._data[key] = value
+        if entry == old_entry:
+            return
+
+        self._removed_keys.discard(key)
+        self._component._mark_dirty()
+        if old_entry is not None and old_entry.hash == entry.hash:
+            # only the metadata changed (e.g. eager), the stored blobs stay
+            return
+        self._encoded[key] = encoded
         self._needs_save.add(key)
-        if old_hash and old_hash != self._metadata.get(key):
-            self._needs_deletion.append(old_hash)
+        if old_entry is not None:
+            self._needs_deletion.extend(old_entry.blobs())
 
     def delete(self, key: str):
         """Delete data from storage"""
         if key in self._data:
             del self._data[key]
         if key in self._metadata.entries:
-            self._needs_deletion.append(self._metadata.get(key).hash)
+            self._needs_deletion.extend(self._metadata.get(key).blobs())
             del self._metadata.entries[key]
+            self._removed_keys.add(key)
+            self._component._mark_dirty()
         if key in self._needs_save:
             self._needs_save.remove(key)
+        self._encoded.pop(key, None)
+
+
+def _invalidate_trees():
+    """Structure of a component tree changed, cached trees must be rebuilt
+
+    The components of outdated trees are released right away, so that removed
+    components are not kept alive by a cached tree.
+    """
+    global _tree_version
+    _tree_version += 1
+    if len(_cached_trees):
+        for tree in list(_cached_trees):
+            tree.pre, tree.parents, tree.post = [], [], []
+        _cached_trees.clear()
+
+
+def _invalidating(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        _invalidate_trees()
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class _SlotList(list):
+    """Components of a slot, changing it invalidates the cached trees"""
+
+    __slots__ = ()
+
+
+for _name in [
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+]:
+    setattr(_SlotList, _name, _invalidating(getattr(list, _name)))
+
+
+class _Slots(dict):
+    """Slots of a component, changing them invalidates the cached trees"""
+
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, slots: dict | None) -> "_Slots":
+        """Wrap the slots of a component, no trees are invalidated"""
+        self = cls()
+        if slots:
+            for key, value in slots.items():
+                dict.__setitem__(self, key, _as_slot(value))
+        return self
+
+    @_invalidating
+    def __setitem__(self, key, value):
+        super().__setitem__(key, _as_slot(value))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+for _name in ["__delitem__", "pop", "popitem", "clear"]:
+    setattr(_Slots, _name, _invalidating(getattr(dict, _name)))
+del _name
+
+
+def _as_slot(value):
+    if isinstance(value, list) and not isinstance(value, _SlotList):
+        return _SlotList(value)
+    return value
+
+
+class _ComponentTree:
+    """Flattened component tree for linear scans instead of recursive walks
+
+    Components are stored in pre-order with the position of their parent, the
+    post-order is used to emit events (children before parents).
+    """
+
+    def __init__(self, root: "Component"):
+        self.version = _tree_version
+        self.pre = []
+        self.parents = []
+        self.post = []
+        self._add(root, -1, set())
+
+    def _add(self, comp, parent: int, visited: set):
+        if comp in visited:
+            return
+        visited.add(comp)
+        index = len(self.pre)
+        self.pre.append(comp)
+        self.parents.append(parent)
+        for slot in comp.ui_slots.values():
+            if isinstance(slot, Callable):
+                continue
+            for child in slot:
+                if not isinstance(child, str):
+                    child._parent = comp
+                    child.context = comp.context
+                    self._add(child, index, visited)
+        self.post.append(comp)
+
+    @property
+    def valid(self) -> bool:
+        return self.version == _tree_version
+
+    def visit(self, *visitors: tuple[Callable, object]):
+        """Call several (func, arg) visitors parent first in one scan
+
+        Like :meth:`Component._recurse`, the return value of func(comp, arg) is
+        passed as arg to the children (func(comp) is called if arg is None).
+        """
+        args = [[None] * len(self.pre) for _ in visitors]
+        for i, (comp, parent) in enumerate(zip(self.pre, self.parents)):
+            for (func, root_arg), values in zip(visitors, args):
+                arg = root_arg if parent < 0 else values[parent]
+                values[i] = func(comp) if arg is None else func(comp, arg)
+
+    def emit(self, event, value: Optional[dict] = None):
+        """Emit event to all components, children first"""
+        with frontend_batch():
+            for comp in self.post:
+                comp._handle(event, value)
 
 
 class BlockFrontendUpdate(type):
@@ -328,6 +1074,96 @@ class BlockFrontendUpdate(type):
         return super().__new__(cls, name, bases, dct)
 
 
+def _num_parameters(func: Callable) -> int:
+    """Same as len(inspect.signature(func).parameters), read from the code
+    object for plain functions and methods"""
+    target = getattr(func, "__func__", func)
+    code = getattr(target, "__code__", None)
+    if (
+        code is None
+        or hasattr(target, "__wrapped__")
+        or hasattr(target, "__signature__")
+    ):
+        return len(inspect.signature(func).parameters)
+    num = (
+        code.co_argcount
+        + code.co_kwonlyargcount
+        + bool(code.co_flags & inspect.CO_VARARGS)
+        + bool(code.co_flags & inspect.CO_VARKEYWORDS)
+    )
+    # bound method, self is not a parameter
+    return num - 1 if target is not func else num
+
+
+def _call_later(delay: float, func: Callable) -> Callable:
+    """Call func after delay seconds, returns a function that cancels the call"""
+    if is_pyodide():
+        import asyncio
+
+        return asyncio.get_event_loop().call_later(delay, func).cancel
+    timer = threading.Timer(delay, func)
+    timer.daemon = True
+    timer.start()
+    return timer.cancel
+
+
+class _RateLimitedHandler:
+    """Event handler that runs at a bounded rate
+
+    With throttling, the first event is handled immediately and further events
+    within the interval once at its end. With debouncing, the handler runs when
+    no new event arrived for the given time. Delayed calls get the latest event
+    only, or all events in order if latest_only is False.
+    """
+
+    def __init__(self, func, takes_event, throttle_ms, debounce_ms, latest_only):
+        self.func = func
+        self.takes_event = takes_event
+        self.throttle = (throttle_ms or 0) / 1000
+        self.debounce = (debounce_ms or 0) / 1000
+        self.latest_only = latest_only
+        self._lock = threading.Lock()
+        self._pending = []
+        self._cancel = None
+        self._last_call = None
+
+    def __call__(self, ev):
+        with self._lock:
+            if self.latest_only:
+                self._pending = [ev]
+            else:
+                self._pending.append(ev)
+            now = time.monotonic()
+            wait = self.debounce
+            if self._last_call is not None:
+                wait = max(wait, self._last_call + self.throttle - now)
+            if self.debounce:
+                # every event restarts the timer
+                if self._cancel is not None:
+                    self._cancel()
+                    self._cancel = None
+            elif self._cancel is not None:
+                # a call is already scheduled and will get this event
+                return
+            if wait > 0:
+                self._cancel = _call_later(wait, self._flush)
+                return
+        self._flush()
+
+    def _flush(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+            self._cancel = None
+            self._last_call = time.monotonic()
+        with frontend_batch():
+            for ev in events:
+                try:
+                    self.func(ev) if self.takes_event else self.func()
+                except Exception as e:
+                    print("have exception in _handle", str(e))
+                    print_exception(e, file=sys.stdout)
+
+
 @dataclasses.dataclass
 class Event:
     name: str
@@ -351,16 +1187,22 @@ class Event:
 class Component(metaclass=BlockFrontendUpdate):
     """Base component class, the component name is passed as argument"""
 
-    _callbacks: dict[str, List[Callable]]
+    # callbacks, bindings and the storage are only allocated when used,
+    # most components (e.g. table cells) never need them
+    _callbacks: dict[str, List[Callable]] = _EMPTY_DICT
+    _js_callbacks: dict[str, Callable] = _EMPTY_DICT
+    _observable_bindings: dict[str, tuple] = _EMPTY_DICT
     _id: str
     _namespace_id: str | None = None
+    # (namespace id, full id) the full id was computed for
+    _fullid_cache: tuple[str, str] | None = None
     _parent: C | None = None
     context: AppContext = None
     _namespace: bool
     _js_component = None
     _component_name: str
-    _keybindings: List[Tuple[str, Callable, dict]]
-    storage: Storage
+    _keybindings: List[Tuple[str, Callable, dict]] = ()
+    _storage: Storage | None = None
 
     @utils._count_calls
     def __init__(
@@ -375,26 +1217,20 @@ class Component(metaclass=BlockFrontendUpdate):
         id: str = "",
     ):
         self._index = next(_component_counter)
+        self._version = next(_version_counter)
         _components[self._index] = self
-        self._keybindings = []
 
         if "." in id:
             raise ValueError("Component id cannot contain '.'")
 
-        self._callbacks = {}
-        self._js_callbacks = {}
-
         self._component_name = component
         self._props = {}
-        self._observable_bindings = {}
-        self.ui_slots = ui_slots or {}
+        # not part of any tree yet, nothing to invalidate
+        self._ui_slots = _Slots.of(ui_slots)
         self._namespace = namespace
         self._id = id
 
-        self.storage = Storage(self)
-        self.on_save(self.storage.save)
-
-        self.ui_slots["default"] = list(ui_children)
+        dict.__setitem__(self._ui_slots, "default", _SlotList(ui_children))
 
         for c in self.ui_slots["default"]:
             if isinstance(c, Component):
@@ -479,6 +1315,8 @@ class Component(metaclass=BlockFrontendUpdate):
             return
         # store keybindings until component is mounted
         if not self._keybindings:
+            self._keybindings = []
+
             def add_keybinding_later():
                 bindings = self._keybindings
                 self._keybindings = []
@@ -489,6 +1327,17 @@ class Component(metaclass=BlockFrontendUpdate):
 
         self._keybindings.append((key, callback, options))
 
+    @property
+    def storage(self) -> Storage:
+        """Storage for large data, see :class:`Storage`"""
+        if self._storage is None:
+            self._storage = Storage(self)
+        return self._storage
+
+    @storage.setter
+    def storage(self, value: Storage):
+        self._storage = value
+
     @property
     def js(self):
         """
@@ -556,6 +1405,15 @@ class Component(metaclass=BlockFrontendUpdate):
         """
         return _QProxy(self.js)
 
+    @property
+    def ui_slots(self) -> dict:
+        return self._ui_slots
+
+    @ui_slots.setter
+    def ui_slots(self, value: dict):
+        _invalidate_trees()
+        self._ui_slots = _Slots.of(value)
+
     @property
     def ui_children(self):
         return self.ui_slots["default"]
@@ -652,22 +1510,43 @@ class Component(metaclass=BlockFrontendUpdate):
                     else parent._namespace_id
                 )
                 self.context = parent.context
-            if self._id:
-                _components_with_id[self._fullid] = self
-                self.context.components_by_id[self._fullid] = self
+            self._register_fullid()
+
+    def _register_fullid(self):
+        if self._id:
+            _components_with_id[self._fullid] = self
+            self.context.components_by_id[self._fullid] = self
+
+    def _unregister_fullid(self):
+        if not self._id or self._namespace_id is None:
+            return
+        fullid = self._fullid
+        registries = [_components_with_id]
+        if self.context is not None:
+            registries.append(self.context.components_by_id)
+        for registry in registries:
+            if registry.get(fullid) is self:
+                del registry[fullid]
 
     @property
     def _fullid(self):
-        if self._namespace_id is None:
+        namespace_id = self._namespace_id
+        if namespace_id is None:
             utils._trace_call("_calc_namespace_id._fullid")
             self._calc_namespace_id()
-
-        if not self._id:
-            return ""
-
-        if self._namespace_id:
-            return self._namespace_id + "." + self._id
-        return self._id
+            namespace_id = self._namespace_id
+
+        # computed once per namespace change, interned for fast dict lookups
+        cache = self._fullid_cache
+        if cache is None or cache[0] != namespace_id:
+            if not self._id:
+                fullid = ""
+            elif namespace_id:
+                fullid = sys.intern(namespace_id + "." + self._id)
+            else:
+                fullid = sys.intern(self._id)
+            cache = self._fullid_cache = (namespace_id, fullid)
+        return cache[1]
 
     def _init_prop(self, key, value):
         """Set a prop during __init__, with Observable support."""
@@ -676,6 +1555,8 @@ class Component(metaclass=BlockFrontendUpdate):
         if isinstance(value, Observable):
             self._props[key] = value.display_value
             dispose = value.on_change(lambda new, _, obs=value: self._set_prop(key, obs.display_value))
+            if self._observable_bindings is _EMPTY_DICT:
+                self._observable_bindings = {}
             self._observable_bindings[key] = (value, dispose)
         else:
             self._props[key] = value
@@ -688,13 +1569,24 @@ class Component(metaclass=BlockFrontendUpdate):
             if key in self._observable_bindings:
                 self._observable_bindings[key][1]()
             dispose = value.on_change(lambda new, _, obs=value: self._set_prop(key, obs.display_value))
+            if self._observable_bindings is _EMPTY_DICT:
+                self._observable_bindings = {}
             self._observable_bindings[key] = (value, dispose)
             value = value.display_value
         old_value = self._props.get(key, None)
         self._props[key] = value
         if value != old_value:
+            self._mark_dirty()
             self._update_frontend({"props": {key: value}})
 
+    def _mark_dirty(self):
+        """Mark dumped data (props, storage) as changed"""
+        self._version = next(_version_counter)
+
+    def _changed_since(self, version: int) -> bool:
+        # components with custom dumps keep state outside of the props
+        return self._version > version or type(self)._dump is not Component._dump
+
     @utils._count_calls
     def _set_slot(self, key: str, value):
         self.ui_slots[key] = value
@@ -746,11 +1638,14 @@ class Component(metaclass=BlockFrontendUpdate):
             raise RuntimeError(
                 f"JS component method call not supported in environment {env.type}"
             )
+        # the method might depend on props that are still queued
+        _flush_frontend_updates()
         self._js_component._call_method(method, args, ignore_result=True)
 
     def _js_callback(self, name, arg=None):
         """Call callback on frontend component"""
         if name in self._js_callbacks:
+            _flush_frontend_updates()
             self._js_callbacks[name](arg)
 
     # @result_to_js
@@ -766,8 +1661,15 @@ class Component(metaclass=BlockFrontendUpdate):
 
     @utils._count_calls
     def _update_frontend(self, data=None, method="update_frontend", blocking=False):
-        environment = get_environment()
-        environment.frontend.update_component(self, data, method, blocking=blocking)
+        frontend = get_environment().frontend
+        if getattr(_frontend_batch, "depth", 0) > 0:
+            if method == "update_frontend" and not blocking:
+                if not frontend._skip_update(self):
+                    _queue_frontend_update(self, data)
+                return
+            # keep the order of queued and immediate updates
+            _flush_frontend_updates()
+        frontend.update_component(self, data, method, blocking=blocking)
 
     def download_file(
         self,
@@ -795,30 +1697,51 @@ class Component(metaclass=BlockFrontendUpdate):
         func: Callable[[Event], None] | Callable[[], None],
         arg: object = None,
         clear_existing: bool = False,
+        throttle_ms: int | None = None,
+        debounce_ms: int | None = None,
+        latest_only: bool = True,
     ):
-        """Add event listener"""
-        events = [events] if isinstance(events, str) else events
+        """Add event listener
 
-        num_args = len(inspect.signature(func).parameters)
+        For high-frequency events (sliders, mouse moves), ``throttle_ms`` runs
+        the handler at most once per interval and ``debounce_ms`` only after no
+        event arrived for the given time. Delayed calls get the latest event
+        (or all events in order with ``latest_only=False``) and run in a timer
+        thread (an asyncio callback in pyodide).
+        """
+        events = [events] if isinstance(events, str) else events
 
-        if num_args == 0:
-            wrapper = lambda _: func()
+        # handlers are stored with a flag if they take the event, so that no
+        # event object is created for handlers without arguments
+        if _num_parameters(func) == 0:
+            handler = (func, False)
         elif arg is not None:
 
             def wrapper(ev: Event):
                 ev.arg = arg
                 return func(ev)
 
+            handler = (wrapper, True)
         else:
-            wrapper = func
+            handler = (func, True)
+
+        if throttle_ms or debounce_ms:
+            handler = (
+                _RateLimitedHandler(
+                    *handler, throttle_ms, debounce_ms, latest_only
+                ),
+                True,
+            )
 
+        if self._callbacks is _EMPTY_DICT:
+            self._callbacks = {}
         for event in events:
             if clear_existing:
                 self._callbacks[event] = []
 
             if event not in self._callbacks:
                 self._callbacks[event] = []
-            self._callbacks[event].append(wrapper)
+            self._callbacks[event].append(handler)
         return self
 
     @utils._count_calls
@@ -911,59 +1834,127 @@ class Component(metaclass=BlockFrontendUpdate):
             return (data, exclude)
 
         data = {}
-        self._recurse(func, True, set(), (data, exclude_default))
+        self._tree().visit((func, (data, exclude_default)))
         return data
 
-    def _dump_storage(self, include_data=False):
+    def _dump_storage(self, include_data=False, since: int | None = None):
         def func(comp, data):
             if comp._namespace:
                 data[comp._id] = {}
                 data = data[comp._id]
 
-            if not comp.storage._metadata.entries.keys():
+            storage = comp._storage
+            if storage is None:
+                return data
+            if since is not None:
+                if comp._version <= since or not (
+                    storage._metadata.entries or storage._removed_keys
+                ):
+                    return data
+            elif not storage._metadata.entries.keys():
                 return data
 
             if not comp._id:
                 raise RuntimeError(
                     "Component with input storage must have id"
                     + str(comp.__class__)
-                    + str(comp.storage._metadata.entries.keys())
+                    + str(storage._metadata.entries.keys())
                 )
 
             if comp._id in data:
                 raise RuntimeError("Duplicate keys in components", comp._id)
 
-            data[comp._id] = comp.storage._dump(include_data)
+            data[comp._id] = (
+                storage._dump(include_data)
+                if since is None
+                else storage._dump_delta()
+            )
             return data
 
         data = {}
-        self._recurse(func, True, set(), data)
+        self._tree().visit((func, data))
         return data
 
+    def _storages(self) -> list[Storage]:
+        """Storages of all components that use one"""
+        storages = []
+
+        def func(comp):
+            if comp._storage is not None:
+                storages.append(comp._storage)
+
+        self._tree().visit((func, None))
+        return storages
+
     def _save_storage_local(self):
-        self._recurse(lambda comp: comp.storage._save_local(), True, set())
+        for storage in self._storages():
+            storage._save_local()
+
+    def _save_storage_backend(self, file_id, storages: list | None = None):
+        """Upload unsaved storage data of all components with one flush
+
+        This also covers the "save" event, components don't register a
+        storage save callback on their own. ``storages`` are the storages of
+        all components if they are known already.
+        """
+        if storages is None:
+            storages = self._storages()
+        storages = [s for s in storages if s._needs_save or s._needs_deletion]
+        if storages:
+            Storage._save_backend(storages, file_id)
 
     def _load_storage_local(self):
-        self._recurse(lambda comp: comp.storage._load_local(), True, set())
+        for storage in self._storages():
+            storage._load_local()
 
-    def _load_storage(self, data):
-        def func(comp, data):
-            if comp._namespace:
-                if comp._id not in data:
-                    return data
-                data = data[comp._id]
+    def _prefetch_storage(self):
+        """Load storage data of keys flagged as eager in a background thread"""
+        pending = []
 
-            if not comp._id:
+        def func(comp):
+            storage = comp._storage
+            if storage is None:
+                return
+            for key, mdata in storage._metadata.entries.items():
+                if mdata.eager and key not in storage._data:
+                    pending.append((storage, key))
+
+        self._tree().visit((func, None))
+        if not pending:
+            return
+
+        def prefetch():
+            for storage, key in pending:
+                if key in storage._data:
+                    continue
+                try:
+                    storage.load(key)
+                except Exception as e:
+                    print_exception(e, file=sys.stdout)
+
+        if is_pyodide():
+            prefetch()
+        else:
+            threading.Thread(
+                target=prefetch, name="ngapp-storage-prefetch", daemon=True
+            ).start()
+
+    @staticmethod
+    def _load_storage_visitor(comp, data):
+        if comp._namespace:
+            if comp._id not in data:
                 return data
+            data = data[comp._id]
 
-            comp.storage._load_data(data.get(comp._id, None))
+        if not comp._id:
             return data
 
-        self._recurse(func, True, set(), data)
-
-    def _load_recursive(self, data, update_frontend=False):
-        self._block_frontend_update = True
+        if comp._id in data:
+            comp.storage._load_data(data[comp._id])
+        return data
 
+    @staticmethod
+    def _load_visitor(update_frontend=False):
         def func(comp, data):
             if comp._namespace:
                 if comp._id not in data:
@@ -976,14 +1967,29 @@ class Component(metaclass=BlockFrontendUpdate):
             if comp._id in data:
                 comp._block_frontend_update = True
                 comp._load(data[comp._id])
+                comp._mark_dirty()
                 if update_frontend:
                     comp._update_frontend()
                 comp._block_frontend_update = False
             return data
 
-        self._recurse(func, True, set(), data)
+        return func
+
+    def _load_storage(self, data):
+        self._tree().visit((Component._load_storage_visitor, data))
+
+    def _load_recursive(self, data, update_frontend=False):
+        self._block_frontend_update = True
+        with frontend_batch():
+            self._tree().visit(
+                (Component._load_visitor(update_frontend), data)
+            )
         self._block_frontend_update = False
 
+    def _tree(self) -> _ComponentTree:
+        """Flattened tree of this component and all children"""
+        return _ComponentTree(self)
+
     @utils._count_calls
     def _recurse(
         self, func: Callable, parent_first: bool, visited: set, arg=None
@@ -1015,50 +2021,57 @@ class Component(metaclass=BlockFrontendUpdate):
     @utils._count_calls
     def _emit_recursive(self, event, value: Optional[dict] = None) -> None:
         """Emit event to all components"""
-        self._recurse(
-            lambda comp: comp._handle(event, value),
-            parent_first=False,
-            visited=set(),
-        )
+        self._tree().emit(event, value)
         return None
 
     @utils._count_calls
     def _set_parent(self, parent):
-        changed = (
-            self._parent != parent
-            and self._namespace_id != parent._namespace_id
-        )
-        self._parent = parent
-        self.context = parent.context
-        if changed and self.context and not self._block_frontend_update:
+        namespace_id = parent._namespace_id
+        if namespace_id is not None and parent._namespace:
+            namespace_id = parent._fullid
+        if self._parent is not parent:
+            _invalidate_trees()
+        if namespace_id != self._namespace_id or self.context is not parent.context:
             utils._trace_call("_calc_namespace_id._set_parent")
-            self._namespace_id = None
-            self._calc_namespace_id()
+            self._unregister_fullid()
+            self._parent = parent
+            self.context = parent.context
+            # stays None (computed on access) while the parent is not attached
+            self._namespace_id = namespace_id
+            if namespace_id is not None and self.context is not None:
+                self._register_fullid()
+        self._parent = parent
 
     @utils._count_calls
     def _set_parent_recursive(self, parent):
-        """Set parent for all components"""
-        self._set_parent(parent)
-
-        def func(comp):
+        """Set parent, context and full ids of this subtree in one pass"""
+        stack = [(self, parent)]
+        visited = set()
+        while stack:
+            comp, parent = stack.pop()
+            if comp in visited:
+                continue
+            visited.add(comp)
+            comp._set_parent(parent)
             for slot in comp.ui_slots.values():
                 if isinstance(slot, Callable):
                     continue
                 for child in slot:
                     if not isinstance(child, str):
-                        child._set_parent(parent)
-
-        self._recurse(func, True, set())
+                        stack.append((child, comp))
 
     def _clear_js_callbacks(self):
-        self._js_callbacks = {}
+        self._js_callbacks = _EMPTY_DICT
 
     @utils._count_calls
     def _set_js_component(self, js_comp):
         self._js_component = js_comp
+        _mounted_components[self._index] = self
 
     @utils._count_calls
     def _set_js_callback(self, name, func):
+        if self._js_callbacks is _EMPTY_DICT:
+            self._js_callbacks = {}
         self._js_callbacks[name] = func
 
     @utils._count_calls
@@ -1075,6 +2088,9 @@ class Component(metaclass=BlockFrontendUpdate):
                     comps = create_function(ev.value)
                     for comp in comps:
                         comp._set_parent_recursive(self)
+                        if not isinstance(comp, str):
+                            # only referenced by the frontend until unmounted
+                            _mounted_components[comp._index] = comp
                     return [
                         (
                             {"compId": comp}
@@ -1111,21 +2127,29 @@ class Component(metaclass=BlockFrontendUpdate):
     def _handle(self, event, value: Optional[dict] = None) -> None:
         """Handle event"""
         ret = None
-        try:
-            if is_pyodide():
-                import pyodide.ffi
-
-                if isinstance(value, pyodide.ffi.JsProxy):
-                    value = value.to_py()
-
-            if event in self._callbacks:
-                ev = Event(component=self, name=event, value=value)
-                for func in self._callbacks[event]:
+        handlers = self._callbacks.get(event)
+        if not handlers:
+            return ret
+        with frontend_batch():
+            try:
+                if is_pyodide():
+                    import pyodide.ffi
+
+                    if isinstance(value, pyodide.ffi.JsProxy):
+                        value = value.to_py()
+
+                ev = None
+                for func, takes_event in handlers:
+                    if not takes_event:
+                        ret = func()
+                        continue
+                    if ev is None:
+                        ev = Event(component=self, name=event, value=value)
                     ret = func(ev)
 
-        except Exception as e:
-            print("have exception in _handle", str(e))
-            print_exception(e, file=sys.stdout)
+            except Exception as e:
+                print("have exception in _handle", str(e))
+                print_exception(e, file=sys.stdout)
         return ret
 
     def _get_registered_events(self):
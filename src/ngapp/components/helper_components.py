@@ -2,13 +2,17 @@
 import datetime
 import subprocess
 import tempfile
+import threading
+import time
 from pathlib import Path
 from typing import Callable, Literal
 
 from .. import api
 from ..utils import (
+    EnvironmentType,
     JSFile,
     Job,
+    get_environment,
     is_pyodide,
     load_file_backend,
     new_file,
@@ -18,6 +22,7 @@ from ..utils import (
 from .basecomponent import (
     Component,
     Event,
+    _call_later,
     get_component,
 )  # needed from frontend:
 from .qcomponents import (
@@ -562,6 +567,9 @@ class JobComponent(QBtn):
     :param compute_function: Function that is called with compute_node
     """
 
+    # maximal number of progress reports per second sent by a running job
+    report_rate: float = 5.0
+
     def __init__(
         self,
         id: str,
@@ -575,6 +583,10 @@ class JobComponent(QBtn):
         self._set_prop("icon", "mdi-play")
         self.job_status: dict = {}
         self.job: Job | None = None
+        self._report_lock = threading.Lock()
+        self._report_pending: dict = {}
+        self._report_last = 0.0
+        self._report_cancel = None
         self.on("click", self._on_click)
         self.on("load", self.update_job_status)
 
@@ -635,8 +647,61 @@ class JobComponent(QBtn):
 
     @progress.setter
     def progress(self, value):
-        self.job_status["progress"] = value
-        self._update_button()
+        self.report(progress=value)
+
+    @property
+    def metrics(self) -> dict:
+        return self.job_status.get("metrics", {})
+
+    def report(self, progress: float | None = None, metrics: dict | None = None):
+        """Report progress and metrics of the running job.
+
+        Cheap enough to call from tight solver loops: reports are merged and
+        sent to the frontend at most ``report_rate`` times per second, as
+        one message. The last report is always sent.
+
+        :param progress: Progress of the job, between 0 and 1
+        :param metrics: Values to show, merged with the ones reported before
+        """
+        with self._report_lock:
+            if progress is not None:
+                self._report_pending["progress"] = progress
+            if metrics:
+                self._report_pending.setdefault("metrics", {}).update(metrics)
+            if self._report_cancel is not None:
+                # the scheduled report will include this one
+                return
+            wait = self._report_last + 1 / self.report_rate - time.monotonic()
+            if wait > 0:
+                self._report_cancel = _call_later(wait, self._flush_report)
+                return
+        self._flush_report()
+
+    def _flush_report(self):
+        with self._report_lock:
+            data, self._report_pending = self._report_pending, {}
+            if self._report_cancel is not None:
+                self._report_cancel()
+                self._report_cancel = None
+            self._report_last = time.monotonic()
+        if not data:
+            return
+        if get_environment().type == EnvironmentType.COMPUTE:
+            self._set_job_progress(data)
+            self._update_frontend(data, method="job_progress")
+        else:
+            self._on_job_progress(data)
+
+    def _set_job_progress(self, data: dict):
+        if "progress" in data:
+            self.job_status["progress"] = data["progress"]
+        if "metrics" in data:
+            self.job_status["metrics"] = self.metrics | data["metrics"]
+
+    def _on_job_progress(self, data: dict):
+        """Progress report received from the running job"""
+        self._set_job_progress(data)
+        self._handle("progress", data)
 
     def update_job_status(self):
         if self.job is not None:
@@ -672,6 +737,13 @@ class JobComponent(QBtn):
         """Set the function to be called when the job is started."""
         self.on("start", handler)
 
+    def on_progress(self, handler: Callable):
+        """Set the function to be called when the running job reports progress.
+
+        The event value is a dict with the reported ``progress`` and/or ``metrics``.
+        """
+        self.on("progress", handler)
+
 
 class SimulationTable(QTable):
     """A table to display simulations from the server, if no dialog is given, the rows must be set manually"""
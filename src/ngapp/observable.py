@@ -11,7 +11,15 @@ an :class:`Observable` and an ngapp :class:`~ngapp.components.Component`
 widget, keeping the two in sync with a built-in re-entrancy guard.
 
 :func:`observable_batch` allows grouping multiple value changes so that
-listeners are invoked only once per observable after all changes are applied.
+listeners are invoked only once per changed observable after all changes are
+applied.
+
+:func:`computed` creates read-only observables derived from other
+observables, which are recomputed on demand when one of them changed.
+
+Expensive listeners can run in the background with
+``on_change(cb, run_in="thread")`` (or ``"task"``), where only the latest
+value is processed and results of superseded values are discarded.
 
 Example
 -------
@@ -32,6 +40,13 @@ Example
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import inspect
+import sys
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from typing import Any, Callable, Generic, TypeVar
 
@@ -42,18 +57,22 @@ T = TypeVar("T")
 # ---------------------------------------------------------------------------
 
 _batch_depth: int = 0
-_batch_pending: list[tuple[Callable, Any, Any]] = []
+# changed observables with their value before the batch, in order of change
+_batch_pending: dict[Observable, Any] = {}
 
 
 @contextmanager
 def observable_batch():
     """Defer :class:`Observable` listener invocations until the block exits.
 
-    Within the managed block, setting :attr:`Observable.value` records
-    pending notifications instead of dispatching them immediately.  When
-    the outermost block exits, every recorded callback is invoked exactly
-    once in the order it was queued.  Batches may be nested; listeners
-    fire only when the outermost batch completes.
+    Within the managed block, setting :attr:`Observable.value` only records
+    the observable instead of notifying listeners.  When the outermost block
+    exits, the listeners of every changed observable are called once with
+    ``(last value, value before the batch)``, in the order the observables
+    were first changed.  Observables that end up at their old value are
+    skipped.  The resulting component updates are sent to the frontend as
+    one merged update.  Batches may be nested; listeners fire only when the
+    outermost batch completes.
 
     This is useful when multiple observables must be updated atomically
     to avoid redundant or intermediate side-effects.
@@ -73,13 +92,190 @@ def observable_batch():
         yield
     finally:
         _batch_depth -= 1
-        if _batch_depth == 0:
-            pending = _batch_pending.copy()
-            _batch_pending.clear()
-            for cb, new, old in pending:
+        if _batch_depth == 0 and _batch_pending:
+            _flush_batch()
+
+
+def _flush_batch():
+    from .components.basecomponent import frontend_batch
+
+    # computed observables after their inputs
+    pending = sorted(_batch_pending.items(), key=lambda item: item[0]._level)
+    _batch_pending.clear()
+    with frontend_batch():
+        for observable, old in pending:
+            new = observable.value
+            if new == old:
+                continue
+            for cb in list(observable._listeners):
                 cb(new, old)
 
 
+# ---------------------------------------------------------------------------
+# Background listeners
+# ---------------------------------------------------------------------------
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# (listener, generation) of the background listener running in this context
+_current_run: contextvars.ContextVar = contextvars.ContextVar("_current_run", default=None)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="ngapp-observable")
+        return _executor
+
+
+def superseded() -> bool:
+    """Check if the value processed by the running background listener is outdated.
+
+    Long running listeners registered with ``run_in`` can call this
+    periodically and return early, their result is discarded anyway.
+    Returns ``False`` outside of background listeners.
+    """
+    run = _current_run.get()
+    return run is not None and run[0]._generation != run[1]
+
+
+class _BackgroundListener:
+    """Listener running outside of the setter, latest value wins
+
+    In a thread, at most one call runs at a time and only the last change
+    arriving meanwhile is processed afterwards. As a task, the running call
+    is cancelled by a new change. Results are passed to on_result only if no
+    newer change arrived in the meantime.
+    """
+
+    def __init__(self, func, run_in, on_result):
+        if run_in not in ("thread", "task"):
+            raise ValueError(f"run_in must be 'thread' or 'task', not {run_in!r}")
+        from .utils import is_pyodide
+
+        if run_in == "thread" and is_pyodide():
+            # no threads in the browser
+            run_in = "task"
+        self.func = func
+        self.run_in = run_in
+        self.on_result = on_result
+        self._loop = None
+        if run_in == "task":
+            # changes may come from other threads, e.g. event handlers in
+            # the thread pool of a local app
+            if is_pyodide():
+                self._loop = asyncio.get_event_loop()
+            else:
+                try:
+                    self._loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    raise RuntimeError(
+                        "on_change(run_in='task') must be called from a running event loop"
+                    ) from None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._running = None
+        self._pending = None
+
+    def __call__(self, new, old):
+        with self._lock:
+            self._generation += 1
+            args = (new, old, self._generation)
+            if self.run_in == "task":
+                self._loop.call_soon_threadsafe(self._start_task, args)
+            elif self._running is not None:
+                # replaces (and discards) older pending values
+                self._pending = args
+            else:
+                self._running = _get_executor().submit(self._run_thread, *args)
+
+    def _start_task(self, args):
+        # runs in the event loop
+        if self._running is not None:
+            self._running.cancel()
+        self._running = self._loop.create_task(self._run_task(*args))
+
+    def _call(self, new, old, generation):
+        token = _current_run.set((self, generation))
+        try:
+            return self.func(new, old)
+        finally:
+            _current_run.reset(token)
+
+    def _deliver(self, result, generation):
+        if self.on_result is not None and generation == self._generation:
+            self.on_result(result)
+
+    def _run_thread(self, new, old, generation):
+        from .utils import print_exception
+
+        while True:
+            try:
+                self._deliver(self._call(new, old, generation), generation)
+            except Exception as e:
+                print("have exception in background listener", str(e))
+                print_exception(e, file=sys.stdout)
+            with self._lock:
+                if self._pending is None:
+                    self._running = None
+                    return
+                (new, old, generation), self._pending = self._pending, None
+
+    async def _run_task(self, new, old, generation):
+        from .utils import print_exception
+
+        # the task runs in a copy of the context, set for the whole coroutine
+        _current_run.set((self, generation))
+        try:
+            result = self.func(new, old)
+            if inspect.isawaitable(result):
+                result = await result
+            self._deliver(result, generation)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print("have exception in background listener", str(e))
+            print_exception(e, file=sys.stdout)
+
+
+# ---------------------------------------------------------------------------
+# Dependency tracking
+# ---------------------------------------------------------------------------
+
+class _Tracking(threading.local):
+    """Per thread, computed observables may be evaluated in background listeners"""
+
+    def __init__(self):
+        # observables read while evaluating computed observables, innermost last
+        self.stack: list[set] = []
+        # computed observables being evaluated, to detect cycles
+        self.evaluating: set = set()
+
+
+_tracking = _Tracking()
+
+
+def _invalidate(source: Observable) -> dict:
+    """Mark all computed observables depending on *source* as dirty.
+
+    Returns the ones with listeners, mapped to their last computed value.
+    """
+    notify = {}
+    stack = [source]
+    while stack:
+        observable = stack.pop()
+        for dependent in list(observable._dependents or ()):
+            # dependents of a dirty observable are dirty already
+            if dependent._dirty:
+                continue
+            dependent._dirty = True
+            if dependent._listeners:
+                notify[dependent] = dependent._value
+            stack.append(dependent)
+    return notify
+
+
 # ---------------------------------------------------------------------------
 # Observable
 # ---------------------------------------------------------------------------
@@ -138,7 +334,17 @@ class Observable(Generic[T]):
         temp.display_value     # "0.000123" → "0.000123" wait no "1.23e-04"
     """
 
-    __slots__ = ("_name", "_value", "_listeners", "_converter", "_formatter")
+    __slots__ = (
+        "_name",
+        "_value",
+        "_listeners",
+        "_converter",
+        "_formatter",
+        "_dependents",
+    )
+
+    # position in the dependency graph, computed observables are above their inputs
+    _level = 0
 
     def __init__(
         self, default: T, name: str = "", converter: Callable | None = None,
@@ -149,12 +355,15 @@ class Observable(Generic[T]):
         self._formatter = formatter
         self._value: T = converter(default) if converter else default
         self._listeners: list[Callable[[T, T], None]] = []
+        self._dependents: weakref.WeakSet | None = None
 
     # -- value access -------------------------------------------------------
 
     @property
     def value(self) -> T:
         """The current value."""
+        if _tracking.stack:
+            _tracking.stack[-1].add(self)
         return self._value
 
     @property
@@ -165,8 +374,8 @@ class Observable(Generic[T]):
         Otherwise returns :attr:`value` unchanged.
         """
         if self._formatter is not None:
-            return self._formatter(self._value)
-        return self._value
+            return self._formatter(self.value)
+        return self.value
 
     @value.setter
     def value(self, new: T) -> None:
@@ -179,22 +388,53 @@ class Observable(Generic[T]):
         if old == new:
             return
         self._value = new
+        self._notify(old)
+
+    def _notify(self, old) -> None:
+        notify = _invalidate(self) if self._dependents else {}
         if _batch_depth > 0:
-            for cb in self._listeners:
-                _batch_pending.append((cb, new, old))
-        else:
-            for cb in self._listeners:
-                cb(new, old)
+            # keep the value from before the first change in the batch
+            _batch_pending.setdefault(self, old)
+            for observable, value in notify.items():
+                _batch_pending.setdefault(observable, value)
+            return
+        new = self._value
+        for cb in list(self._listeners):
+            cb(new, old)
+        # glitch free: every computed observable is evaluated after its inputs
+        for observable in sorted(notify, key=lambda o: o._level):
+            new = observable.value
+            if new != notify[observable]:
+                for cb in list(observable._listeners):
+                    cb(new, notify[observable])
 
     # -- subscription -------------------------------------------------------
 
-    def on_change(self, cb: Callable[[T, T], None]) -> Callable[[], None]:
+    def on_change(
+        self,
+        cb: Callable[[T, T], Any],
+        *,
+        run_in: str | None = None,
+        on_result: Callable[[Any], None] | None = None,
+    ) -> Callable[[], None]:
         """Register a listener that is called on every value change.
 
         Parameters
         ----------
         cb : callable(new_value, old_value)
             The callback to invoke when :attr:`value` changes.
+        run_in : {"thread", "task"}, optional
+            Run *cb* in the background instead of inside the setter:
+            ``"thread"`` uses a shared thread pool (one call per listener
+            at a time, intermediate values are skipped), ``"task"`` an
+            asyncio task on the current event loop (*cb* may be a
+            coroutine function, a new change cancels the running task).
+            Use :func:`superseded` in long running threaded listeners to
+            stop early.
+        on_result : callable(result), optional
+            Called with the return value of *cb*, unless the value changed
+            again in the meantime.  With *run_in*, it is called from the
+            worker thread or the event loop.
 
         Returns
         -------
@@ -202,6 +442,10 @@ class Observable(Generic[T]):
             A dispose function.  Calling it removes *cb* from the
             listener list.  Calling it more than once is safe.
         """
+        if run_in is not None:
+            cb = _BackgroundListener(cb, run_in, on_result)
+        elif on_result is not None:
+            cb = lambda new, old, func=cb: on_result(func(new, old))
         self._listeners.append(cb)
 
         def dispose() -> None:
@@ -222,6 +466,99 @@ class Observable(Generic[T]):
         return f"Observable({self._name!r}, {self._value!r})"
 
 
+class Computed(Observable[T]):
+    """A read-only observable derived from other observables.
+
+    The function is called without arguments; every observable whose
+    :attr:`~Observable.value` it reads becomes a dependency.  The result is
+    cached and only recomputed when it is read after a dependency changed
+    (or right away if the computed observable has listeners).  Changes
+    propagate in dependency order, so each computed observable is evaluated
+    at most once per change and never sees partially updated inputs.
+
+    Use :func:`computed` to create instances.
+    """
+
+    __slots__ = ("_fn", "_dependencies", "_dirty", "_level", "__weakref__")
+
+    def __init__(
+        self, fn: Callable[[], T], name: str = "",
+        formatter: Callable | None = None,
+    ):
+        self._name = name
+        self._converter = None
+        self._formatter = formatter
+        self._value = None
+        self._listeners = []
+        self._dependents = None
+        self._fn = fn
+        self._dependencies: set[Observable] = set()
+        self._dirty = True
+        self._level = 1
+
+    @property
+    def value(self) -> T:
+        """The current value, recomputed if a dependency changed."""
+        if self._dirty:
+            self._evaluate()
+        if _tracking.stack:
+            _tracking.stack[-1].add(self)
+        return self._value
+
+    @value.setter
+    def value(self, new: T) -> None:
+        raise AttributeError(f"Computed observable {self._name!r} is read-only")
+
+    def _evaluate(self) -> None:
+        if self in _tracking.evaluating:
+            raise RuntimeError(f"Cyclic dependency in computed observable {self._name!r}")
+        dependencies = set()
+        _tracking.evaluating.add(self)
+        _tracking.stack.append(dependencies)
+        try:
+            value = self._fn()
+        finally:
+            _tracking.stack.pop()
+            _tracking.evaluating.discard(self)
+        for observable in self._dependencies - dependencies:
+            observable._dependents.discard(self)
+        for observable in dependencies - self._dependencies:
+            if observable._dependents is None:
+                observable._dependents = weakref.WeakSet()
+            observable._dependents.add(self)
+        self._dependencies = dependencies
+        self._level = 1 + max((o._level for o in dependencies), default=0)
+        self._value = value
+        self._dirty = False
+
+    def on_change(self, cb: Callable[[T, T], Any], **kwargs) -> Callable[[], None]:
+        # evaluate once, so that the dependencies are known
+        self.value
+        return super().on_change(cb, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"Computed({self._name!r}, {self._value!r})"
+
+
+def computed(
+    fn: Callable[[], T], name: str = "", formatter: Callable | None = None
+) -> Computed[T]:
+    """Create a read-only observable derived from other observables.
+
+    Example
+    -------
+    ::
+
+        camber = Observable(0.02, "camber")
+        angle = Observable(4.0, "angle")
+        lift = computed(lambda: lift_coefficient(camber.value, angle.value), "lift")
+
+        lift.on_change(lambda new, old: print(f"lift: {old:.3f} -> {new:.3f}"))
+        angle.value = 6.0   # lift is recomputed once, the listener is called
+    """
+    return Computed(fn, name, formatter)
+
+
 # ---------------------------------------------------------------------------
 # Two-way widget binding
 # ---------------------------------------------------------------------------
@@ -357,5 +694,9 @@ def restore(obj, data: dict[str, Any]) -> None:
         :func:`snapshot`.
     """
     for v in vars(obj).values():
-        if isinstance(v, Observable) and v._name in data:
+        if (
+            isinstance(v, Observable)
+            and not isinstance(v, Computed)
+            and v._name in data
+        ):
             v.value = data[v._name]
@@ -13,10 +13,11 @@ from functools import wraps
 from pathlib import Path
 
 import deepdiff
+import orjson
 
 import ngapp.components.basecomponent
 from ngapp.app import App
-from ngapp.utils import EnvironmentType, read_json, set_environment, write_json
+from ngapp.utils import EnvironmentType, set_environment, write_json
 
 os.environ["WEBAPP_TESTING"] = str(True)
 
@@ -40,6 +41,37 @@ def _set_local_storage_path(folder_path: str, create_folder: bool = True):
     return path
 
 
+def _storage_files(path: Path) -> list[Path]:
+    """Blob files of a local storage folder, sorted by hash"""
+    return sorted(
+        (
+            p
+            for p in path.rglob("*")
+            if p.is_file() and not p.name.startswith(".tmp-")
+        ),
+        key=lambda p: p.name,
+    )
+
+
+def _storage_codecs(app: App) -> dict[str, str]:
+    """Codecs of the stored blobs of all components by hash"""
+    codecs = {}
+    for storage in app._storages():
+        for mdata in storage._metadata.entries.values():
+            for hash_ in mdata.blobs():
+                codecs[hash_] = mdata.codec
+    return codecs
+
+
+def _read_blob(path: Path, codecs: dict[str, str]) -> bytes:
+    """Data of a local storage blob, decompressed with the codec it was stored with"""
+    data = path.read_bytes()
+    codec = ngapp.components.basecomponent._get_storage_codec(
+        codecs.get(path.name, "none")
+    )
+    return data if codec is None else codec[1](data)
+
+
 def assert_equal_components_data(data: dict, comparison: dict):
     data.pop("metadata")
     comparison.pop("metadata")
@@ -83,35 +115,36 @@ def snapshot(
         with tempfile.TemporaryDirectory() as tempdir:
             temp_storage = _set_local_storage_path(tempdir)
             app._save_storage_local()
-            temp_storage_files = sorted(list(temp_storage.glob("*")))
-            saved_storage_files = sorted(list((folder / "storage").glob("*")))
+            temp_storage_files = _storage_files(temp_storage)
+            saved_storage_files = _storage_files(folder / "storage")
             if len(temp_storage_files) != len(saved_storage_files):
                 raise AssertionError(
                     "Number of storage files do not match. Maybe you forgot to save the storage?\n"
                     f"Number of temp files: {len(temp_storage_files)}, number of saved files: {len(saved_storage_files)}.\n"
                     f"Temp files {temp_storage_files},\n saved files {saved_storage_files}"
                 )
+            codecs = _storage_codecs(app)
             for saved_file, temp_file in zip(
                 saved_storage_files, temp_storage_files
             ):
+                saved = _read_blob(saved_file, codecs)
+                temp = _read_blob(temp_file, codecs)
                 try:
                     # assume data is json
                     assert (
                         deepdiff.DeepDiff(
-                            read_json(saved_file),
-                            read_json(temp_file),
+                            orjson.loads(saved),
+                            orjson.loads(temp),
                             ignore_order=True,
                         )
                         == {}
                     )
                 except Exception:
-                    # try reading as text
-                    try:
-                        assert saved_file.read_text() == temp_file.read_text()
-                    except Exception as e:
-                        raise Exception(
-                            f"Error comparing {saved_file}, data {saved_file.read_text()} and {temp_file}, data {temp_file.read_text()}"
-                        ) from e
+                    # compare the raw data
+                    if saved != temp:
+                        raise AssertionError(
+                            f"Error comparing {saved_file} and {temp_file}, stored data differs"
+                        )
 
     if write_data:
         data = app._dump_app(keep_storage=keep_storage)
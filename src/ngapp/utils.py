@@ -81,6 +81,21 @@ class BaseFrontend:
     def update_component(self, comp, data, method, blocking=True):
         raise NotImplementedError()
 
+    def update_components(self, updates: list[tuple]):
+        """Send updates of several components at once
+
+        :param updates: List of (component, data, method) tuples
+        """
+        for comp, data, method in updates:
+            try:
+                self.update_component(comp, data, method, blocking=False)
+            except Exception as e:
+                print_exception(e, file=sys.stdout)
+
+    def _skip_update(self, comp) -> bool:
+        """Whether updates of a component are currently dropped by this frontend"""
+        return False
+
     def reset_app(self, app):
         raise NotImplementedError("Calling reset from invalid environment!")
 
@@ -92,11 +107,35 @@ class BaseFrontend:
 class BrowserFrontend(BaseFrontend):
     @_count_calls
     def update_component(self, comp, data, method, blocking=True):
+        data = self._prepare_update(comp, data, method)
+        if data is not None:
+            comp._js_callbacks[method](data, _ignore_result=not blocking)
+
+    @_count_calls
+    def update_components(self, updates: list[tuple]):
+        # Prepare all messages first, then send them without waiting for
+        # results, such that the link can push them out back to back
+        messages = []
+        for comp, data, method in updates:
+            try:
+                data = self._prepare_update(comp, data, method)
+            except Exception as e:
+                print_exception(e, file=sys.stdout)
+                continue
+            if data is not None:
+                messages.append((comp._js_callbacks[method], data))
+        for callback, data in messages:
+            try:
+                callback(data, _ignore_result=True)
+            except Exception as e:
+                print_exception(e, file=sys.stdout)
+
+    def _prepare_update(self, comp, data, method):
         if method not in comp._js_callbacks:
-            return
+            return None
 
         if comp._js_component is None:
-            return
+            return None
 
         if data is None:
             data = {
@@ -113,8 +152,7 @@ class BrowserFrontend(BaseFrontend):
                 method=method,
                 **data,
             )
-
-        comp._js_callbacks[method](data, _ignore_result=not blocking)
+        return data
 
     def reset_app(self, app):
         self.link.call_method_ignore_return(
@@ -156,45 +194,79 @@ class BrowserFrontend(BaseFrontend):
 
 
 class ComputeFrontend(BaseFrontend):
+    def _skip_update(self, comp) -> bool:
+        return (
+            comp._block_frontend_update
+            or comp.context is None
+            or comp.context.app is None
+        )
+
+    _have_bulk_update: bool = True
+
     def update_component(self, comp, data, method, blocking=True):
         try:
-            if comp._block_frontend_update:
-                return
-
-            if comp.context is None:
-                return
+            message = self._prepare_update(comp, data, method)
+            if message is not None:
+                api.post("/update_frontend", data=message)
+        except Exception as e:
+            print_exception(e, file=sys.stdout)
 
-            if comp.context.app is None:
+    def update_components(self, updates: list[tuple]):
+        messages = []
+        for comp, data, method in updates:
+            try:
+                message = self._prepare_update(comp, data, method)
+            except Exception as e:
+                print_exception(e, file=sys.stdout)
+                continue
+            if message is not None:
+                messages.append(message)
+
+        if len(messages) > 1 and self._have_bulk_update:
+            try:
+                api.post("/update_frontend_bulk", data={"updates": messages})
                 return
+            except Exception as e:
+                if api.is_unsupported(e):
+                    print("Backend has no bulk updates, sending single updates")
+                    self._have_bulk_update = False
+                else:
+                    # retry one by one
+                    print("Bulk update failed, sending single updates:", e)
+
+        for message in messages:
+            try:
+                api.post("/update_frontend", data=message)
+            except Exception as e:
+                print_exception(e, file=sys.stdout)
+
+    def _prepare_update(self, comp, data, method):
+        if self._skip_update(comp):
+            return None
 
-            if data is None:
-                data = {
-                    "data": comp._dump(),
-                    "storage": comp.storage._dump_metadata(),
-                }
+        if data is None:
+            data = {
+                "data": comp._dump(),
+                "storage": comp.storage._dump_metadata(),
+            }
 
-            data["source"] = "backend"
+        data["source"] = "backend"
 
-            if comp.context.capture_events:
-                data["debug"] = comp._get_debug_data(
-                    method=method,
-                    **data,
-                )
+        if comp.context.capture_events:
+            data["debug"] = comp._get_debug_data(
+                method=method,
+                **data,
+            )
 
-            file_id = comp.context.app.metadata["id"]
-            component_id = comp._fullid
-            if component_id:
-                api.post(
-                    "/update_frontend",
-                    data={
-                        "file_id": file_id,
-                        "component_id": component_id,
-                        "method": method,
-                        "data": data,
-                    },
-                )
-        except Exception as e:
-            print_exception(e, file=sys.stdout)
+        component_id = comp._fullid
+        if not component_id:
+            return None
+        return {
+            "file_id": comp.context.app.metadata["id"],
+            "component_id": component_id,
+            "method": method,
+            "data": data,
+        }
 
 
 class EnvironmentType(str, Enum):
@@ -323,14 +395,36 @@ class Environment:
         if method == "update_frontend":
             if "data" in data:
                 comp._load(data["data"])
+                comp._mark_dirty()
             if "props" in data:
                 comp._props.update(data["props"])
+                comp._mark_dirty()
             if "storage" in data:
                 comp.storage._load_metadata(data["storage"])
+                comp._mark_dirty()
+
+        if method == "job_progress":
+            comp._on_job_progress(data)
 
         if method in comp._js_callbacks:
             comp._js_callbacks[method](data)
 
+    def _update_python_components(self, updates: list[dict]):
+        """Called from JS for bulk updates received from the backend
+
+        Each entry has the same keys as the arguments of :meth:`_update_python_component`.
+        """
+        from .components.basecomponent import frontend_batch
+
+        with frontend_batch():
+            for update in updates:
+                self._update_python_component(
+                    file_id=update["file_id"],
+                    method=update["method"],
+                    data=update["data"],
+                    component_id=update.get("component_id", None),
+                )
+
     def load_data_local(self, options: dict | None = None):
         import pickle
 
@@ -400,6 +494,7 @@ def get_environment() -> Environment:
     return _environment
 
 
+@functools.cache
 def is_pyodide() -> bool:
     """Check if the code is executed in pyodide"""
     try:
@@ -968,7 +1063,12 @@ def compute_node(
                         _job_component.update_job_status()
                         app.save()
 
-                    ret = f(self, *args, **kwargs)
+                    try:
+                        ret = f(self, *args, **kwargs)
+                    finally:
+                        if _job_component:
+                            # send the last progress report right away
+                            _job_component._flush_report()
 
                     # workaound the issue https://github.com/rq/rq/issues/1631,
                     # once fixed use update_job_status in on_succes callback
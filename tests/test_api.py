@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import http.server
+import threading
+
+import orjson
+import pytest
+
+from ngapp import api
+from ngapp.utils import Environment, EnvironmentType, set_environment
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # GET /wait/... blocks until enough requests are in flight
+    barrier: threading.Barrier | None = None
+
+    def _reply(self, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/wait/"):
+            self.barrier.wait(5)
+        self._reply(orjson.dumps({"path": self.path}))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._reply(self.rfile.read(length))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def backend():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    old = (
+        Environment.backend_api_url,
+        Environment.backend_api_token,
+        Environment.backend_api_client_id,
+    )
+    Environment.set_backend(f"http://127.0.0.1:{server.server_port}", "token")
+    api.reset_pools()
+    yield server
+    Environment.set_backend(*old)
+    api.reset_pools()
+    server.shutdown()
+
+
+def test_requests_reuse_pooled_connection(backend):
+    before = api.stats()
+    for i in range(5):
+        assert api.get(f"/item/{i}") == {"path": f"/item/{i}"}
+    assert api.post("/echo", {"a": 1}) == {"a": 1}
+
+    after = api.stats()
+    assert after["requests"] - before["requests"] == 6
+    assert after["connections"] == 1
+    assert after["reused"] == 5
+
+
+def test_request_all_keeps_request_order(backend):
+    results = api.request_all(
+        [("GET", f"/item/{i}") for i in range(6)] + [("POST", "/echo", [1])]
+    )
+    assert results == [{"path": f"/item/{i}"} for i in range(6)] + [[1]]
+
+
+def test_async_requests_run_concurrently(backend, monkeypatch):
+    import asyncio
+
+    # each request blocks until all three are in flight
+    monkeypatch.setattr(_Handler, "barrier", threading.Barrier(3))
+
+    async def main():
+        single = await api.aget("/single")
+        many = await api.agather(
+            ("GET", "/wait/a"),
+            ("GET", "/wait/b"),
+            ("GET", "/wait/c"),
+            ("POST", "/echo", {"b": 2}),
+        )
+        return single, many
+
+    # a fresh loop in another thread, pytest-playwright keeps a loop running
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(asyncio.run(main()))
+    )
+    thread.start()
+    thread.join()
+    single, many = results[0]
+    assert single == {"path": "/single"}
+    assert many == [
+        {"path": "/wait/a"},
+        {"path": "/wait/b"},
+        {"path": "/wait/c"},
+        {"b": 2},
+    ]
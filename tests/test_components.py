@@ -0,0 +1,536 @@
+from __future__ import annotations
+
+import pytest
+
+from ngapp.components import Div, Label
+from ngapp.components.basecomponent import AppContext, frontend_batch
+from ngapp.utils import EnvironmentType, set_environment
+
+
+def _recording_environment():
+    env = set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    calls = []
+    env.frontend.update_component = (  # type: ignore[method-assign]
+        lambda comp, data, method, blocking=True: calls.append(
+            (comp, data, method)
+        )
+    )
+    return calls
+
+
+def _quiet_environment(have_backend: bool):
+    # drops frontend updates without keeping references to the components
+    env = set_environment(EnvironmentType.STANDALONE, have_backend=have_backend)
+    env.frontend.update_component = lambda *a, **k: None
+    return env
+
+
+@pytest.fixture
+def quiet_environment():
+    return _quiet_environment(have_backend=False)
+
+
+@pytest.fixture
+def backend_environment():
+    return _quiet_environment(have_backend=True)
+
+
+@pytest.fixture
+def compute_context():
+    """Context of components in a compute environment, for file id 7"""
+    set_environment(EnvironmentType.COMPUTE, have_backend=True)
+
+    class FakeApp:
+        metadata = {"id": 7}
+
+    return AppContext(app=FakeApp())
+
+
+def test_event_handler_sends_one_merged_update_per_component():
+    calls = _recording_environment()
+    a = Label("a")
+    b = Label("b")
+    root = Div(a, b)
+
+    def handler():
+        for i in range(10):
+            a.ui_style = f"width: {i}px"
+            b.ui_class = f"c{i}"
+        a.ui_class = "done"
+
+    root.on("click", handler)
+    calls.clear()
+    root._handle("click")
+
+    assert [(c, m) for c, _, m in calls] == [
+        (a, "update_frontend"),
+        (b, "update_frontend"),
+    ]
+    assert calls[0][1] == {"props": {"style": "width: 9px", "class": "done"}}
+    assert calls[1][1] == {"props": {"class": "c9"}}
+
+
+def test_full_update_supersedes_partial_updates():
+    calls = _recording_environment()
+    label = Label("a")
+    calls.clear()
+
+    with frontend_batch():
+        label.ui_style = "color: red"
+        label._update_frontend()
+        label.ui_class = "x"
+        assert calls == []
+
+    assert calls == [(label, None, "update_frontend")]
+
+
+def test_other_methods_flush_queued_updates_first():
+    calls = _recording_environment()
+    label = Label("a")
+    calls.clear()
+
+    with frontend_batch():
+        label.ui_style = "color: red"
+        label._update_frontend({"x": 1}, method="Redraw")
+
+    assert [m for _, _, m in calls] == ["update_frontend", "Redraw"]
+
+
+def test_compute_frontend_sends_bulk_update(monkeypatch, compute_context):
+    from ngapp import api
+
+    posts = []
+    monkeypatch.setattr(
+        api, "post", lambda url, data: posts.append((url, data))
+    )
+    comps = [Label(id=f"label{i}") for i in range(3)]
+    for comp in comps:
+        comp._namespace_id = ""
+        comp.context = compute_context
+
+    with frontend_batch():
+        for comp in comps:
+            comp.ui_class = "x"
+
+    assert len(posts) == 1
+    url, data = posts[0]
+    assert url == "/update_frontend_bulk"
+    assert [u["component_id"] for u in data["updates"]] == [
+        "label0",
+        "label1",
+        "label2",
+    ]
+    assert all(u["file_id"] == 7 for u in data["updates"])
+
+
+def test_compute_frontend_falls_back_only_without_bulk_endpoint(
+    monkeypatch, compute_context
+):
+    from ngapp import api
+    from ngapp.utils import get_environment
+
+    status = 502
+    posts = []
+
+    def post(url, data):
+        posts.append(url)
+        if url == "/update_frontend_bulk":
+            raise api.RequestError("Request failed", url, data, status)
+
+    monkeypatch.setattr(api, "post", post)
+    frontend = get_environment().frontend
+    comps = [Label(id=f"label{i}") for i in range(2)]
+    for comp in comps:
+        comp._namespace_id = ""
+        comp.context = compute_context
+
+    def update(ui_class):
+        posts.clear()
+        with frontend_batch():
+            for comp in comps:
+                comp.ui_class = ui_class
+
+    # a failing request is sent again as single updates, bulk stays enabled
+    update("x0")
+    assert posts == ["/update_frontend_bulk"] + ["/update_frontend"] * 2
+    assert frontend._have_bulk_update
+
+    status = 404
+    update("x1")
+    assert not frontend._have_bulk_update
+    update("x2")
+    assert posts == ["/update_frontend"] * 2
+
+
+def test_save_backend_sends_only_changed_components(
+    monkeypatch, backend_environment
+):
+    from ngapp import api
+    from ngapp.components import Col, QInput
+    from tests.local_app_demo.app import InputChangeApp
+
+    class DeltaApp(InputChangeApp):
+        def __init__(self):
+            super().__init__()
+            self.a = QInput(id="a", ui_model_value=1)
+            self.b = QInput(id="b", ui_model_value=2)
+            self.component = Col(self.a, self.b)
+
+    calls = []
+    monkeypatch.setattr(
+        api, "_request", lambda method, url, data: calls.append((method, data))
+    )
+    app = DeltaApp()
+    app.file_data.id = 7
+
+    app.save_backend()
+    app.a.ui_model_value = 5
+    app.save_backend()
+    app.component = Col(app.a)
+    app.save_backend()
+
+    assert [method for method, _ in calls] == ["PUT", "PATCH", "PUT"]
+    delta = calls[1][1]["component"]["data"]
+    assert list(delta) == ["a"] and delta["a"]["model-value"] == 5
+    assert "b" not in calls[2][1]["component"]["data"]
+
+
+def _merge_patch(target, patch):
+    """JSON merge patch (RFC 7396) as applied by the backend"""
+    if not isinstance(patch, dict):
+        return patch
+    target = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = _merge_patch(target.get(key), value)
+    return target
+
+
+def test_patched_model_loads_like_full_model(monkeypatch, backend_environment):
+    from ngapp import api
+    from ngapp.components import Col, QInput
+    from tests.local_app_demo.app import InputChangeApp
+
+    class StatusLabel(Label):
+        status: dict = {}
+
+        def _dump(self):
+            return {"status": self.status} if self.status else None
+
+    class DeltaApp(InputChangeApp):
+        def __init__(self):
+            super().__init__()
+            self.a = QInput(id="a", ui_model_value=1)
+            self.b = StatusLabel(id="b")
+            self.component = Col(self.a, self.b)
+
+    stored = {}
+    methods = []
+
+    def request(method, url, data):
+        methods.append(method)
+        if method == "PUT":
+            stored["model"] = data
+        elif method == "PATCH":
+            stored["model"] = _merge_patch(stored["model"], data)
+
+    monkeypatch.setattr(api, "_request", request)
+    app = DeltaApp()
+    app.file_data.id = 7
+    app.a.storage._metadata.set("x", b"1", "bytes", b"a", eager=True)
+    app.a.storage._metadata.set("y", b"2", "bytes", b"a")
+    app.a._mark_dirty()
+    app.save_backend()
+
+    def check_save(*expected):
+        methods.clear()
+        app.save_backend()
+        assert methods == list(expected)
+        full = app._dump_app()["component"]
+        assert stored["model"]["component"]["data"] == full["data"]
+
+    app.a.ui_model_value = {"x": 1, "y": 2}
+    app.b.status = {"id": 3}
+    check_save("PATCH")
+    # removed keys and components without data are removed on the backend
+    app.a.ui_model_value = {"x": 1}
+    app.b.status = {}
+    check_save("PATCH")
+    app.a.storage._metadata.set("x", b"1", "bytes", b"a")
+    app.a.storage.delete("y")
+    # the blob of y is deleted as well
+    check_save("PATCH", "DELETE")
+    assert not app.a.storage._removed_keys
+    assert "eager" not in stored["model"]["component"]["storage"]["a"]["x"]
+    # a merge patch can't set None values
+    app.a.ui_model_value = None
+    check_save("PUT")
+
+    loaded = DeltaApp()
+    loaded.update(stored["model"])
+    assert loaded.a.ui_model_value is None
+    assert loaded.a.storage._dump() == app.a.storage._dump()
+    assert app.a.storage._dump() == {"x": app.a.storage._dump()["x"]}
+
+
+def test_save_backend_disables_patch_only_without_endpoint(
+    monkeypatch, backend_environment
+):
+    from ngapp import api
+    from ngapp import app as app_module
+    from tests.local_app_demo.app import InputChangeApp
+
+    status = 502
+    calls = []
+
+    def request(method, url, data):
+        calls.append(method)
+        if method == "PATCH":
+            raise api.RequestError("Request failed", url, data, status)
+
+    monkeypatch.setattr(api, "_request", request)
+    monkeypatch.setattr(app_module, "_have_patch_endpoint", True)
+    app = InputChangeApp()
+    app.file_data.id = 7
+    app.save_backend()
+
+    # a failing patch is followed by the full model, patches stay enabled
+    calls.clear()
+    app.result_label.ui_children = ["Result: 1"]
+    app.save_backend()
+    assert calls == ["PATCH", "PUT"]
+    assert app_module._have_patch_endpoint
+
+    status = 405
+    app.result_label.ui_children = ["Result: 2"]
+    app.save_backend()
+    assert not app_module._have_patch_endpoint
+    calls.clear()
+    app.result_label.ui_children = ["Result: 3"]
+    app.save_backend()
+    assert calls == ["PUT"]
+
+
+def test_component_tree_is_cached_until_slots_change():
+    from tests.local_app_demo.app import InputChangeApp
+
+    _recording_environment()
+    app = InputChangeApp()
+    tree = app._tree()
+    assert app._tree() is tree
+    assert tree.pre[0] is app and tree.post[-1] is app
+
+    visited = []
+    tree.visit(
+        (lambda comp, depth: visited.append((comp, depth)) or depth + 1, 0),
+        (lambda comp: None, None),
+    )
+    assert visited[0] == (app, 0)
+    assert all(depth > 0 for _, depth in visited[1:])
+
+    app.result_label.ui_children = ["Result: 1"]
+    assert app._tree() is not tree
+
+
+def test_changed_slots_release_the_cached_tree(quiet_environment):
+    import gc
+    import weakref
+
+    from tests.local_app_demo.app import InputChangeApp
+
+    app = InputChangeApp()
+    label = Label("removed")
+    app.ui_children.append(label)
+    tree = app._tree()
+    assert label in tree.pre
+
+    app.ui_children.remove(label)
+    assert not tree.valid and not tree.pre
+    ref = weakref.ref(label)
+    del label
+    gc.collect()
+    assert ref() is None
+
+    tree = app._tree()
+    app.ui_slots["extra"] = [Div()]
+    assert app._tree() is not tree
+    tree = app._tree()
+    app.result_label._set_parent(Div())
+    assert not tree.valid
+
+
+def test_save_walks_the_cached_tree(monkeypatch, backend_environment):
+    from ngapp import api
+    from ngapp.components.basecomponent import Component
+    from tests.local_app_demo.app import InputChangeApp
+
+    def recurse(*args, **kwargs):
+        raise AssertionError("save must use the cached tree")
+
+    monkeypatch.setattr(api, "_request", lambda method, url, data: None)
+    app = InputChangeApp()
+    app.file_data.id = 7
+    monkeypatch.setattr(Component, "_recurse", recurse)
+    app.save_backend()
+    app.result_label.ui_children = ["Result: 1"]
+    app.save_backend()
+
+
+def test_unreferenced_components_are_released(quiet_environment):
+    import gc
+
+    from ngapp.components.basecomponent import (
+        component_stats,
+        get_component,
+        unmount_component,
+    )
+
+    gc.collect()
+    before = component_stats().get("Label", 0)
+    labels = [Label(str(i)) for i in range(100)]
+    shown = labels[0]
+    shown._set_js_component(object())
+    index = shown._index
+    del labels, shown
+    gc.collect()
+    assert component_stats().get("Label", 0) == before + 1
+
+    unmount_component(index)
+    gc.collect()
+    assert get_component(index) is None
+    assert component_stats().get("Label", 0) == before
+
+
+def test_leaf_components_allocate_callbacks_and_storage_lazily():
+    _recording_environment()
+    div = Div()
+    assert "_callbacks" not in vars(div) and div._storage is None
+
+    div.on("click", lambda: None)
+    storage = div.storage
+    assert list(div._callbacks) == ["click"]
+    assert Div()._callbacks == {}
+    assert div._storage is storage and Div()._storage is None
+
+
+def test_moved_subtree_gets_new_full_ids():
+    from ngapp.components import Col
+    from tests.local_app_demo.app import InputChangeApp
+
+    _recording_environment()
+    app = InputChangeApp()
+    inner = Label("x", id="label")
+    group = Div(Div(inner), id="group", namespace=True)
+    first = Div(group, id="first", namespace=True)
+    second = Div(id="second", namespace=True)
+    app.component = Col(first, second)
+    assert inner._fullid == "first.group.label"
+    assert app["first.group.label"] is inner
+
+    second.ui_children = [group]
+    assert inner._fullid == "second.group.label"
+    assert inner._parent._parent is group
+    assert app["second.group.label"] is inner
+    assert "first.group.label" not in app.context.components_by_id
+
+
+def test_handler_parameters_match_signature():
+    import functools
+    import inspect
+
+    from ngapp.components.basecomponent import _num_parameters
+
+    class Handlers:
+        def method(self, ev):
+            pass
+
+        def no_args(self):
+            pass
+
+        @classmethod
+        def cls_method(cls, ev, *args, key=None, **kwargs):
+            pass
+
+    def decorated(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    funcs = [
+        lambda: None,
+        lambda ev: None,
+        Handlers().method,
+        Handlers().no_args,
+        Handlers.cls_method,
+        decorated(lambda: None),
+        functools.partial(lambda a, ev: None, 1),
+        print,
+    ]
+    for func in funcs:
+        assert _num_parameters(func) == len(inspect.signature(func).parameters)
+
+
+def test_handlers_with_and_without_event():
+    _recording_environment()
+    label = Label("a")
+    received = []
+    label.on("click", lambda: received.append(None))
+    label.on("click", lambda ev: received.append(ev.value))
+    label.on("click", lambda ev: received.append(ev.arg), arg="x")
+    label._handle("click", 5)
+    label._handle("hover", 6)
+    assert received == [None, 5, "x"]
+
+
+def test_throttled_and_debounced_handlers_get_latest_event():
+    import time
+
+    _recording_environment()
+    label = Label("a")
+    throttled, debounced = [], []
+    label.on("drag", lambda ev: throttled.append(ev.value), throttle_ms=50)
+    label.on("drag", lambda ev: debounced.append(ev.value), debounce_ms=20)
+    for i in range(5):
+        label._handle("drag", i)
+    assert throttled == [0] and debounced == []
+
+    for _ in range(100):
+        if len(throttled) == 2 and debounced:
+            break
+        time.sleep(0.01)
+    assert throttled == [0, 4]
+    assert debounced == [4]
+
+
+def test_job_report_is_rate_limited(monkeypatch, compute_context):
+    import time
+
+    from ngapp import api
+    from ngapp.components import JobComponent
+
+    posts = []
+    monkeypatch.setattr(
+        api, "post", lambda url, data: posts.append((url, data))
+    )
+    job = JobComponent(id="job", compute_function=lambda **kwargs: None)
+    job._namespace_id = ""
+    job.context = compute_context
+    posts.clear()
+
+    for i in range(1000):
+        job.report(progress=i / 1000, metrics={"residual": 1.0 / (i + 1)})
+    job.report(metrics={"iterations": 1000})
+    # the first report is sent right away, the rest once at the end
+    time.sleep(2 / job.report_rate)
+
+    assert len(posts) == 2
+    url, message = posts[-1]
+    assert url == "/update_frontend"
+    assert message["method"] == "job_progress"
+    assert message["data"]["progress"] == 0.999
+    assert message["data"]["metrics"] == {"residual": 0.001, "iterations": 1000}
+    assert job.progress == 0.999
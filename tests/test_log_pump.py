@@ -0,0 +1,66 @@
+from ngapp import api
+from ngapp.cli.log_pump import LogPump
+
+
+def test_log_pump_sends_output_in_chunks(tmp_path, monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        api,
+        "request_all",
+        lambda requests, return_exceptions=False: sent.extend(requests)
+        or [None] * len(requests),
+    )
+    stdout, stderr = tmp_path / "stdout", tmp_path / "stderr"
+    text = "Lösung " * 100
+    stdout.write_text(text)
+    stderr.write_text("warning\n")
+
+    pump = LogPump("/job/1", stdout, stderr, echo=False)
+    pump.chunk_size = 64
+    pump.interval = 0.01
+    pump.start()
+    pump.stop("done")
+
+    out = "".join(data for _, url, data in sent if url == "/job/1/stdout")
+    err = "".join(data for _, url, data in sent if url == "/job/1/stderr")
+    # multibyte characters split between chunks are decoded correctly
+    assert out == text + "\nSTATUS: done\n"
+    assert err == "warning\n"
+    assert all(method == "PUT" for method, _, _ in sent)
+    assert max(len(data.encode()) for _, _, data in sent) <= 64 + len(
+        "\nSTATUS: done\n"
+    )
+
+
+def test_log_pump_resends_output_after_failed_request(tmp_path, monkeypatch):
+    sent = []
+    failures = {"/job/1/stdout": 2, "/job/1/stderr": 1}
+
+    def request_all(requests, return_exceptions=False):
+        results = []
+        for method, url, data in requests:
+            if failures.get(url):
+                failures[url] -= 1
+                results.append(
+                    api.RequestError("Request failed", url, data, 502)
+                )
+            else:
+                sent.append((url, data))
+                results.append(None)
+        return results
+
+    monkeypatch.setattr(api, "request_all", request_all)
+    stdout, stderr = tmp_path / "stdout", tmp_path / "stderr"
+    stdout.write_text("Lösung " * 20)
+    stderr.write_text("warning\n")
+
+    pump = LogPump("/job/1", stdout, stderr, echo=False)
+    pump.chunk_size = 64
+    pump.interval = 0.01
+    pump.start()
+    pump.stop("done")
+
+    out = "".join(data for url, data in sent if url == "/job/1/stdout")
+    err = "".join(data for url, data in sent if url == "/job/1/stderr")
+    assert out == "Lösung " * 20 + "\nSTATUS: done\n"
+    assert err == "warning\n"
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from ngapp.components import Label
+from ngapp.observable import (
+    Observable,
+    computed,
+    observable_batch,
+    superseded,
+)
+from ngapp.utils import EnvironmentType, set_environment
+
+
+def test_batch_notifies_once_per_observable():
+    calls = []
+    a = Observable(0, "a")
+    b = Observable("x", "b")
+    a.on_change(lambda new, old: calls.append(("a", new, old)))
+    b.on_change(lambda new, old: calls.append(("b", new, old)))
+
+    with observable_batch():
+        for i in range(100):
+            a.value = i
+        b.value = "y"
+        with observable_batch():
+            b.value = "x"
+    assert calls == [("a", 99, 0)]
+
+
+def test_batch_sends_one_frontend_update():
+    env = set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    updates = []
+    env.frontend.update_component = lambda comp, data, *args, **kwargs: (
+        updates.append(data)
+    )
+    text = Observable("a", "text")
+    style = Observable("", "style")
+    label = Label("x")
+    label._set_prop("text", text)
+    label._set_prop("style", style)
+    updates.clear()
+
+    with observable_batch():
+        for i in range(10):
+            text.value = f"t{i}"
+            style.value = f"width: {i}px"
+    assert updates == [{"props": {"text": "t9", "style": "width: 9px"}}]
+
+
+def test_computed_is_lazy_and_cached():
+    a = Observable(1, "a")
+    b = Observable(2, "b")
+    calls = []
+
+    def total():
+        calls.append(1)
+        return a.value + b.value
+
+    c = computed(total, "c")
+    assert calls == []
+    assert c.value == 3
+    assert c.value == 3
+    assert len(calls) == 1
+
+    a.value = 5
+    assert len(calls) == 1
+    assert c.value == 7
+    assert len(calls) == 2
+
+    with pytest.raises(AttributeError):
+        c.value = 1
+
+
+def test_computed_diamond_notifies_once_in_order():
+    a = Observable(1, "a")
+    left = computed(lambda: a.value + 1, "left")
+    right = computed(lambda: a.value * 2, "right")
+    evaluations = []
+
+    def bottom_fn():
+        evaluations.append((left.value, right.value))
+        return left.value + right.value
+
+    bottom = computed(bottom_fn, "bottom")
+    changes = []
+    bottom.on_change(lambda new, old: changes.append((new, old)))
+    evaluations.clear()
+
+    a.value = 3
+    # evaluated once, with both inputs up to date
+    assert evaluations == [(4, 6)]
+    assert changes == [(10, 4)]
+
+
+def test_computed_in_batch():
+    a = Observable(1, "a")
+    b = Observable(1, "b")
+    c = computed(lambda: a.value + b.value, "c")
+    changes = []
+    c.on_change(lambda new, old: changes.append((new, old)))
+
+    with observable_batch():
+        a.value = 2
+        b.value = 3
+        assert changes == []
+    assert changes == [(5, 2)]
+
+    # unchanged result does not notify
+    with observable_batch():
+        a.value = 3
+        b.value = 2
+    assert changes == [(5, 2)]
+
+
+def test_thread_listener_latest_value_wins():
+    started = threading.Event()
+    release = threading.Event()
+    done = threading.Event()
+    calls = []
+    results = []
+
+    def work(new, old):
+        calls.append(new)
+        if new == 1:
+            started.set()
+            release.wait(5)
+        return new
+
+    def on_result(result):
+        results.append(result)
+        done.set()
+
+    obs = Observable(0, "x")
+    obs.on_change(work, run_in="thread", on_result=on_result)
+    obs.value = 1
+    assert started.wait(5)
+    obs.value = 2
+    obs.value = 3
+    obs.value = 4
+    release.set()
+    assert done.wait(5)
+    # intermediate values are skipped and the stale result is discarded
+    assert calls == [1, 4]
+    assert results == [4]
+
+
+def test_computed_tracks_dependencies_per_thread():
+    x = Observable(1, "x")
+    y = Observable(2, "y")
+    b_started = threading.Event()
+    a_done = threading.Event()
+
+    def b_fn():
+        value = y.value
+        b_started.set()
+        a_done.wait(5)
+        return value
+
+    b = computed(b_fn, "b")
+
+    def a_fn():
+        thread = threading.Thread(target=lambda: b.value)
+        thread.start()
+        # read while b is evaluated in the other thread
+        b_started.wait(5)
+        value = x.value
+        a_done.set()
+        thread.join()
+        return value
+
+    a = computed(a_fn, "a")
+    assert a.value == 1
+    assert a._dependencies == {x}
+    assert b._dependencies == {y}
+
+
+def _run_in_new_loop(coroutine):
+    # a fresh loop in another thread, pytest-playwright keeps a loop running
+    thread = threading.Thread(target=asyncio.run, args=(coroutine,))
+    thread.start()
+    thread.join()
+
+
+def test_task_listener_cancels_stale_work():
+    results = []
+
+    async def work(new, old):
+        await asyncio.sleep(0.01)
+        return new * 10
+
+    async def main():
+        obs = Observable(0, "x")
+        obs.on_change(work, run_in="task", on_result=results.append)
+        obs.value = 1
+        obs.value = 2
+        await asyncio.sleep(0.05)
+
+    _run_in_new_loop(main())
+    assert results == [20]
+
+
+def test_task_listener_sees_superseded_values():
+    started = threading.Event()
+    changed = threading.Event()
+    seen = {}
+
+    async def work(new, old):
+        await asyncio.sleep(0)
+        if new == 1:
+            started.set()
+            # blocking work, the newer value arrives from another thread
+            changed.wait(5)
+        seen[new] = superseded()
+        return new
+
+    def change(obs):
+        started.wait(5)
+        obs.value = 2
+        changed.set()
+
+    async def main():
+        obs = Observable(0, "x")
+        obs.on_change(work, run_in="task")
+        setter = threading.Thread(target=change, args=(obs,))
+        setter.start()
+        obs.value = 1
+        await asyncio.sleep(0.05)
+        setter.join()
+
+    _run_in_new_loop(main())
+    assert seen == {1: True, 2: False}
+    assert not superseded()
+
+
+def test_task_listener_with_changes_from_other_threads():
+    results = []
+
+    async def main():
+        obs = Observable(0, "x")
+        obs.on_change(
+            lambda new, old: new, run_in="task", on_result=results.append
+        )
+        # like event handlers of a local app, running in a thread pool
+        setter = threading.Thread(target=setattr, args=(obs, "value", 3))
+        setter.start()
+        setter.join()
+        await asyncio.sleep(0.05)
+
+    _run_in_new_loop(main())
+    assert results == [3]
+
+    errors = []
+
+    def register_without_loop():
+        try:
+            Observable(0, "y").on_change(lambda new, old: None, run_in="task")
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=register_without_loop)
+    thread.start()
+    thread.join()
+    assert errors and "running event loop" in errors[0]
@@ -0,0 +1,121 @@
+import http.server
+import os
+import stat
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from ngapp.app import App
+from ngapp.cli import pool
+
+pytestmark = pytest.mark.skipif(not pool.available, reason="needs fork")
+
+
+class PoolApp(App):
+    def square(self, x, job_id=None):
+        print(f"job {job_id}: {x * x}")
+
+
+# marks the function as compute function like the compute_node decorator
+setattr(PoolApp.square, "__is_compute_node_function", True)
+
+
+class _FileHandler(http.server.BaseHTTPRequestHandler):
+    """Backend with an empty file for the compute jobs"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _remove_worker(key):
+    path = pool._socket_path(key)
+    path.unlink(missing_ok=True)
+    path.with_suffix(".lock").unlink(missing_ok=True)
+    path.with_suffix(".log").unlink(missing_ok=True)
+
+
+def test_warm_worker_is_reused(tmp_path):
+    key = ("test", str(tmp_path))
+    job = {
+        "data": "invalid",
+        "cwd": str(tmp_path),
+        "stdout": str(tmp_path / "stdout"),
+        "stderr": str(tmp_path / "stderr"),
+    }
+    pids = []
+    try:
+        for _ in range(2):
+            result = pool.run_job(
+                key,
+                sys.executable,
+                dict(os.environ),
+                {},
+                job,
+                on_start=pids.append,
+            )
+            # the job fails decoding its data, the worker keeps running
+            assert result["returncode"] == 1
+            assert "Traceback" in (tmp_path / "stderr").read_text()
+        assert len(set(pids)) == 2
+        assert pool._socket_path(key).exists()
+    finally:
+        _remove_worker(key)
+
+
+def test_warm_worker_runs_jobs(tmp_path, capsys):
+    from ngapp.cli.run import RunData
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    key = ("test-jobs", str(tmp_path))
+    env = dict(os.environ, PYTHONPATH=str(Path(__file__).parents[1]))
+    app = {
+        "name": "pool",
+        "version": "1",
+        "python_class": "tests.test_pool.PoolApp",
+    }
+    try:
+        for job_id in (1, 2):
+            data = RunData(
+                api_url=f"http://127.0.0.1:{server.server_port}",
+                api_token="token",
+                app_id=1,
+                job_id=job_id,
+                file_id=1,
+                func_name="square",
+                compute_env={"env_type": "local"},
+                app=app,
+                args=[job_id + 2],
+            )
+            job = {
+                "data": data.dump(),
+                "cwd": str(tmp_path),
+                "stdout": str(tmp_path / f"stdout{job_id}"),
+                "stderr": str(tmp_path / f"stderr{job_id}"),
+            }
+            result = pool.run_job(key, sys.executable, env, app, job)
+            assert result["returncode"] == 0, (
+                tmp_path / f"stderr{job_id}"
+            ).read_text()
+        assert "job 1: 9" in (tmp_path / "stdout1").read_text()
+        assert "job 2: 16" in (tmp_path / "stdout2").read_text()
+        # the second job ran in the worker started for the first one
+        assert capsys.readouterr().out.count("start warm worker") == 1
+
+        # only this user can access the socket
+        mode = pool._socket_path(key).parent.stat().st_mode
+        assert stat.S_IMODE(mode) == 0o700
+    finally:
+        server.shutdown()
+        _remove_worker(key)
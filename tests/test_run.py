@@ -0,0 +1,120 @@
+import base64
+import os
+import threading
+import time
+
+import pytest
+
+from ngapp.cli import run
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="needs flock")
+
+
+@pytest.fixture
+def venv_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(run, "_VENV_DIR", tmp_path)
+    return tmp_path
+
+
+def test_base_venv_is_built_once_by_concurrent_jobs(venv_dir, monkeypatch):
+    builds = []
+
+    def create_venv(venv_path, with_pip=True):
+        builds.append(venv_path)
+        venv_path.mkdir(parents=True)
+        # others must wait for the venv instead of using it half built
+        time.sleep(0.2)
+
+    monkeypatch.setattr(run, "create_venv", create_venv)
+    monkeypatch.setattr(run, "_pip_install", lambda venv_path, *args: None)
+
+    paths = []
+    threads = [
+        threading.Thread(target=lambda: paths.append(run.create_base_venv()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert set(paths) == {builds[0]}
+    assert (builds[0] / ".ready").exists()
+
+    # a new ngapp version gets its own base venv
+    monkeypatch.setattr(run, "version", "0.0.0-other")
+    assert run.create_base_venv() != builds[0]
+    assert len(builds) == 2
+
+
+def test_old_venvs_are_removed(venv_dir, monkeypatch):
+    monkeypatch.setattr(run, "keep_app_venvs", 1)
+    app_dir = venv_dir / "1"
+    old = time.time() - 2 * run.venv_max_age
+    for name, mtime in [("new", time.time()), ("recent", time.time() - 10)]:
+        (app_dir / name).mkdir(parents=True)
+        (app_dir / name / ".ready").touch()
+        os.utime(app_dir / name / ".ready", (mtime, mtime))
+        run._lock_path(app_dir / name).touch()
+    for name in ["old", "failed"]:
+        (app_dir / name).mkdir(parents=True)
+        run._lock_path(app_dir / name).touch()
+        os.utime(run._lock_path(app_dir / name), (old, old))
+    (app_dir / "old" / ".ready").touch()
+    os.utime(app_dir / "old" / ".ready", (old, old))
+
+    run.remove_old_venvs(app_dir)
+
+    assert sorted(p.name for p in app_dir.iterdir()) == [
+        "new",
+        "new.lock",
+        "recent",
+        "recent.lock",
+    ]
+
+
+def test_venv_lock_survives_removal_of_lock_file(venv_dir):
+    venv_path = venv_dir / "1" / "abc"
+    order = []
+
+    def build():
+        with run._locked(venv_path):
+            order.append("build")
+
+    with run._locked(venv_path):
+        thread = threading.Thread(target=build)
+        thread.start()
+        time.sleep(0.1)
+        # removed together with the venv, the waiting job locks the new file
+        run._lock_path(venv_path).unlink()
+        order.append("remove")
+    thread.join()
+    assert order == ["remove", "build"]
+    assert run._lock_path(venv_path).exists()
+
+
+def test_wheel_cache_is_keyed_by_content(venv_dir, monkeypatch):
+    installed = []
+    monkeypatch.setattr(
+        run, "_pip_install", lambda venv_path, *args: installed.append(args)
+    )
+
+    def package(data: bytes):
+        return {
+            "name": "app-1.0-py3-none-any.whl",
+            "data": base64.b64encode(data).decode(),
+        }
+
+    run.install_packages(venv_dir, [package(b"first")])
+    run.install_packages(venv_dir, [package(b"rebuilt")])
+    run.install_packages(venv_dir, [package(b"first")])
+
+    (first,), (rebuilt,), (again,) = installed
+    assert first != rebuilt and first == again
+    assert first.read_bytes() == b"first" and rebuilt.read_bytes() == b"rebuilt"
+
+    old = time.time() - 2 * run.venv_max_age
+    os.utime(rebuilt.parent, (old, old))
+    run.remove_old_wheels()
+    assert first.exists() and not rebuilt.parent.exists()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+from ngapp import utils
+from ngapp.cli.run import RunData, run_compute_function
+
+
+class _RecordingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests: list = []
+
+    def _record(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.requests.append((self.path, self.headers.get("Authorization")))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = do_POST = do_PUT = _record
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    # jobs and the compute env module switch to the COMPUTE environment
+    monkeypatch.setattr(utils, "_environment", utils._environment)
+
+
+def _run_data(url: str, job_id: int) -> RunData:
+    return RunData(
+        api_url=url,
+        api_token=f"token{job_id}",
+        app_id=1,
+        job_id=job_id,
+        file_id=1,
+        func_name="f",
+        compute_env={},
+        app={},
+    )
+
+
+def test_concurrent_jobs_use_their_own_backend_access():
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), _RecordingHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        threads = [
+            threading.Thread(
+                target=run_compute_function, args=(_run_data(url, job_id),)
+            )
+            for job_id in (1, 2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+
+    job_requests = [
+        r for r in _RecordingHandler.requests if r[0].startswith("/job/")
+    ]
+    assert {path.split("/")[2] for path, _ in job_requests} == {"1", "2"}
+    for path, token in job_requests:
+        assert token == f"token{path.split('/')[2]}"
+
+
+def test_failed_job_frees_its_slot(monkeypatch):
+    from ngapp.cli import serve_compute_env
+
+    def run_compute_function(data, on_start):
+        on_start(None)
+        raise RuntimeError("broken job")
+
+    monkeypatch.setattr(
+        serve_compute_env, "run_compute_function", run_compute_function
+    )
+    executor = serve_compute_env.JobExecutor(cpus=2, memory=0, max_queued=1)
+    executor._jobs[1] = None
+    executor._used_cpus = 2
+
+    with pytest.raises(RuntimeError, match="broken job"):
+        asyncio.run(executor._run_job(_run_data("", 1), 2, 0))
+
+    assert executor._jobs == {}
+    assert executor._used_cpus == 0
@@ -35,3 +35,24 @@ def test_snapshot_roundtrip() -> None:
         app_again, folder_path="snapshot_demo/default", load_storage=True
     )
     assert isinstance(data, dict)
+
+
+@standalone_app_test
+def test_snapshot_of_loaded_case_with_storage(tmp_path) -> None:
+    """Storage loaded by load_case is compared by snapshot"""
+    folder_path = str(tmp_path / "tests" / "cases" / "storage_demo")
+    app = InputChangeApp()
+    app.storage.set("result", {"area": 15})
+    # compressed, stored data of this size is no text
+    app.storage.set("mesh", bytes(range(256)) * 512)
+    snapshot(app, folder_path=folder_path, write_data=True, keep_storage=True)
+
+    app_again = InputChangeApp()
+    load_case(app_again, folder_path=folder_path, load_storage=True)
+    snapshot(
+        app_again,
+        folder_path=folder_path,
+        check_data=True,
+        check_storage=True,
+    )
+    assert app_again.storage.get("result") == {"area": 15}
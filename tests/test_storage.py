@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from ngapp import api
+from ngapp.components import Div
+from ngapp.components.basecomponent import AppContext, FileData, Storage
+from ngapp.utils import Environment, EnvironmentType, set_environment
+
+
+@pytest.fixture
+def backend_calls(monkeypatch):
+    calls = []
+
+    def request(method, url, data=None):
+        calls.append((method, url, data))
+        if url.endswith("/files_exist"):
+            return data["hashes"][:1]
+        return None
+
+    monkeypatch.setattr(api, "_request", request)
+    monkeypatch.setattr(Environment, "have_backend", True)
+    set_environment(EnvironmentType.STANDALONE, have_backend=True)
+    return calls
+
+
+class _App:
+    file_data = FileData(app_id="1", id=5)
+
+
+def _component(id):
+    comp = Div(id=id)
+    comp._namespace_id = ""
+    comp.context = AppContext(app=_App())
+    return comp
+
+
+def test_tree_wide_save_skips_existing_blobs(backend_calls):
+    a, b = _component("a"), _component("b")
+    a.storage.set("x", b"1")
+    a.storage.set("y", b"2")
+    b.storage.set("z", "3")
+
+    Storage._save_backend([a.storage, b.storage], file_id=5)
+
+    methods = [(m, url) for m, url, _ in backend_calls]
+    assert methods[0] == ("POST", "/files/5/files_exist")
+    uploads = [url for m, url in methods[1:]]
+    assert len(uploads) == 2
+    first_hash = backend_calls[0][2]["hashes"][0]
+    assert f"/files/5/files/{first_hash}" not in uploads
+    assert not a.storage._needs_save and not b.storage._needs_save
+
+
+def test_existence_check_is_disabled_only_without_endpoint(monkeypatch):
+    from ngapp.components import basecomponent
+
+    status = 503
+    calls = []
+
+    def request(method, url, data=None):
+        calls.append(url)
+        if url.endswith("/files_exist"):
+            raise api.RequestError("Request failed", url, data, status)
+
+    monkeypatch.setattr(api, "_request", request)
+    monkeypatch.setattr(basecomponent, "_have_files_exist_endpoint", True)
+    set_environment(EnvironmentType.STANDALONE, have_backend=True)
+
+    def save(*values):
+        calls.clear()
+        a = _component("a")
+        for i, value in enumerate(values):
+            a.storage.set(str(i), value)
+        Storage._save_backend([a.storage], file_id=5)
+        return [url for url in calls if not url.endswith("/files_exist")]
+
+    # after a failing check everything is uploaded, the check stays enabled
+    assert len(save(b"1", b"2")) == 2
+    assert basecomponent._have_files_exist_endpoint
+
+    status = 404
+    assert len(save(b"3", b"4")) == 2
+    assert not basecomponent._have_files_exist_endpoint
+    save(b"5", b"6")
+    assert not any(url.endswith("/files_exist") for url in calls)
+
+
+def test_changed_metadata_marks_component_dirty(backend_calls):
+    a = _component("a")
+    a.storage.set("x", b"1")
+    a.storage._needs_save.clear()
+    version = a._version
+
+    a.storage.set("x", b"1")
+    assert a._version == version
+
+    a.storage.set("x", b"1", eager=True)
+    assert a._version > version
+    assert a.storage._metadata.get("x").eager
+    # same data, nothing to upload or delete
+    assert not a.storage._needs_save and not a.storage._needs_deletion
+
+
+def test_replaced_values_are_deleted_once(backend_calls):
+    a = _component("a")
+    a.storage.set("x", b"1")
+    old_hash = a.storage._metadata.get("x").hash
+    a.storage.save()
+    a.storage.set("x", b"2")
+    a.storage.save()
+    a.storage.save()
+
+    deletes = [data for m, _, data in backend_calls if m == "DELETE"]
+    assert deletes == [[old_hash]]
+
+
+def test_deleted_values_are_deleted_without_uploads(backend_calls):
+    a = _component("a")
+    a.storage.set("x", b"1")
+    old_hash = a.storage._metadata.get("x").hash
+    a.storage.save()
+    backend_calls.clear()
+
+    a.storage.delete("x")
+    a.storage.save()
+
+    assert backend_calls == [("DELETE", "/files/5/files", [old_hash])]
+    assert not a.storage._needs_deletion
+
+
+def test_local_blob_store_evicts_least_recently_used(tmp_path):
+    import os
+
+    from ngapp.components.basecomponent import _LocalBlobStore
+
+    store = _LocalBlobStore(tmp_path, max_bytes=350)
+    for i, name in enumerate(["aa1", "bb2", "cc3"]):
+        store.write(name, bytes(100))
+        os.utime(store._blob_path(name), (i, i))
+    assert store.read("aa1") == bytes(100)
+    assert (tmp_path / "aa" / "aa1").is_file()
+
+    store.write("dd4", bytes(100))
+
+    assert store.has("aa1") and store.has("cc3") and store.has("dd4")
+    assert not store.has("bb2")
+    stats = store.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 300
+    assert stats["hit_rate"] == 1.0
+
+
+def test_local_storage_without_backend_is_not_evicted(tmp_path, monkeypatch):
+    from ngapp.components import basecomponent
+
+    monkeypatch.setattr(basecomponent, "_local_storage_path", tmp_path)
+    monkeypatch.setattr(basecomponent, "_local_storage_max_bytes", 100)
+    set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    a = _component("a")
+    a.storage.set("x", bytes(80))
+    a.storage.set("y", bytes(range(80)))
+    a.storage._save_local()
+
+    b = _component("a")
+    b.storage._load_data(a.storage._dump())
+    assert b.storage.get("x") == bytes(80)
+    assert b.storage.get("y") == bytes(range(80))
+    assert basecomponent.local_storage_stats()["evictions"] == 0
+
+
+def test_local_blob_store_reads_flat_layout(tmp_path):
+    from ngapp.components.basecomponent import _LocalBlobStore
+
+    (tmp_path / "abc").write_bytes(b"old")
+    store = _LocalBlobStore(tmp_path, max_bytes=1000)
+    assert store.read("abc") == b"old"
+    assert store.read("missing") is None
+    assert store.stats()["misses"] == 1
+
+
+def test_local_storage_is_loaded_on_first_access(tmp_path, monkeypatch):
+    from ngapp.components import basecomponent
+
+    monkeypatch.setattr(basecomponent, "_local_storage_path", tmp_path)
+    set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    a = _component("a")
+    a.storage.set("mesh", {"points": [1, 2, 3]})
+    a.storage.set("small", "x", eager=True)
+    a.storage._save_local()
+
+    b = _component("a")
+    b.storage._load_data(a.storage._dump())
+    assert b.storage._data == {}
+
+    b._prefetch_storage()
+    for _ in range(100):
+        if "small" in b.storage._data:
+            break
+        time.sleep(0.01)
+    assert list(b.storage._data) == ["small"]
+    assert b.storage.get("mesh") == {"points": [1, 2, 3]}
+    assert b.storage._dump(include_data=True)["data"] == {
+        "mesh": {"points": [1, 2, 3]},
+        "small": "x",
+    }
+
+
+def test_large_values_are_compressed_transparently(tmp_path, monkeypatch):
+    from ngapp.components import basecomponent
+
+    monkeypatch.setattr(basecomponent, "_local_storage_path", tmp_path)
+    set_environment(EnvironmentType.STANDALONE, have_backend=False)
+    value = {"values": [0.5] * 50_000}
+    a = _component("a")
+    a.storage.set("field", value)
+    a.storage.set("small", "abc")
+    a.storage.set("forced", "abc", codec="zlib")
+    a.storage._save_local()
+
+    entries = a.storage._metadata.entries
+    assert entries["field"].codec == "zlib"
+    assert entries["small"].codec == "none"
+    stored = basecomponent._get_local_store().read(entries["field"].hash)
+    assert len(stored) * 5 < entries["field"].size
+
+    b = _component("a")
+    b.storage._load_data(a.storage._dump())
+    assert b.storage.get("field") == value
+    assert b.storage.get("forced") == "abc"
+    assert "codec" not in a.storage._dump()["small"]
+
+    with pytest.raises(ValueError):
+        a.storage.set("x", "abc", codec="unknown")
+
+
+def test_arrays_are_stored_as_raw_buffer(backend_calls, monkeypatch):
+    np = pytest.importorskip("numpy")
+    a = _component("a")
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    encode_calls = []
+    encode = Storage._encode
+    monkeypatch.setattr(
+        Storage,
+        "_encode",
+        lambda self, *args: encode_calls.append(args) or encode(self, *args),
+    )
+    a.storage.set("field", array, codec="none")
+    array[0, 0] = 100
+    a.storage.set("field", a.storage.get("field"))
+    a.storage.save()
+    monkeypatch.setattr(Storage, "_encode", encode)
+
+    entry = a.storage._metadata.get("field")
+    assert (entry.dtype, entry.shape) == ("<f4", [3, 4])
+    assert entry.size == array.nbytes
+    # value and id are encoded once per set, the upload reuses the buffer
+    assert len(encode_calls) == 4
+    uploads = [data for m, _, data in backend_calls if m == "POST"]
+    assert len(uploads) == 1
+    assert bytes(uploads[0]) == np.arange(12, dtype=np.float32).tobytes()
+
+    loaded = a.storage._decode(bytes(uploads[0]), entry)
+    assert loaded.shape == (3, 4) and loaded[0, 0] == 0
+
+
+def test_other_arrays_are_stored_as_json(backend_calls):
+    np = pytest.importorskip("numpy")
+    a = _component("a")
+    dates = np.array(["2020-01-01", "2020-01-02"], dtype="datetime64[D]")
+    for value, expected in [
+        (np.zeros((0, 3)), []),
+        (dates, ["2020-01-01T00:00:00", "2020-01-02T00:00:00"]),
+    ]:
+        a.storage.set("x", value)
+        entry = a.storage._metadata.get("x")
+        assert entry.dtype is None
+        data = bytes(a.storage._encoded_value("x"))
+        assert a.storage._decode(data, entry) == expected
+
+
+def test_large_values_are_transferred_in_chunks(monkeypatch):
+    blobs = {}
+    calls = []
+
+    def request(method, url, data=None):
+        calls.append((method, url))
+        hash_ = url.rsplit("/", 1)[-1]
+        if url.endswith("/files_exist"):
+            return [h for h in data["hashes"] if h in blobs]
+        if method == "POST":
+            blobs[hash_] = bytes(data)
+        if method == "GET":
+            return blobs[hash_]
+
+    monkeypatch.setattr(api, "_request", request)
+    monkeypatch.setattr(Storage, "chunk_size", 1000)
+    set_environment(EnvironmentType.STANDALONE, have_backend=True)
+    value = bytes(range(256)) * 10
+    a = _component("a")
+    a.storage.set("blob", value, codec="zlib")
+    chunks = a.storage._metadata.get("blob").chunks
+    assert len(chunks) == 3
+
+    # interrupted save: the second save only uploads the missing chunks
+    blobs[chunks[0]] = a.storage._stored_data("blob", 0)
+    a.storage.save()
+    uploads = [url for m, url in calls if m == "POST" and "exist" not in url]
+    assert uploads == [f"/files/5/files/{h}" for h in chunks[1:]]
+
+    b = _component("a")
+    b.storage._load_data(a.storage._dump())
+    with b.storage.open("blob") as f:
+        f.seek(990)
+        assert f.read(20) == value[990:1010]
+    assert b.storage.get("blob") == value
+
+    a.storage.delete("blob")
+    assert a.storage._needs_deletion == chunks